@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+
+# Copyright 2020 Ricardo González
+# Licensed under the Apache License, Version 2.0
+
+"""
+Benchmark of devloy and ccdb over a synthetic workspace.
+
+The workspace has N repositories, each one a git worktree layout (<repo>/master with the .git directory and
+<repo>/<branch> linked worktrees) with a colcon.pkg and a repos file listing its dependencies, and a build directory
+with a compile command database per package. Docker is never called.
+
+Usage: benchmarks/benchmark.py --repos 300 --entries 200 --output results.json
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).absolute().parent.parent))
+
+from ccdb import core as ccdb_core  # noqa: E402
+from ccdb.manifest import Manifest  # noqa: E402
+from devloy.defaults import Defaults, DockerDefaults  # noqa: E402
+from devloy.docker import ContainerSnapshot  # noqa: E402
+from devloy.index import SearchPathsIndex  # noqa: E402
+from devloy.projects_info import ProjectsInfo  # noqa: E402
+from devloy.start import StartCommand  # noqa: E402
+
+MAIN_BRANCH = 'master'
+
+
+def write_git_dir(git_dir, repo_name, branch):
+    (git_dir / 'refs' / 'heads').mkdir(parents=True)
+    (git_dir / 'HEAD').write_text('ref: refs/heads/{}\n'.format(branch))
+    (git_dir / 'config').write_text(
+            '[core]\n\trepositoryformatversion = 0\n'
+            '[remote "origin"]\n\turl = https://git.example.com/{}.git\n'
+            '\tfetch = +refs/heads/*:refs/remotes/origin/*\n'.format(repo_name))
+
+
+def add_worktree(repo_dir, repo_name, branch):
+    """
+    Create a linked worktree like `git worktree add ../<branch> <branch>` does.
+    """
+    main_git_dir = repo_dir / MAIN_BRANCH / '.git'
+    worktree_git_dir = main_git_dir / 'worktrees' / branch
+    worktree_git_dir.mkdir(parents=True)
+    (worktree_git_dir / 'HEAD').write_text('ref: refs/heads/{}\n'.format(branch))
+    (worktree_git_dir / 'commondir').write_text('../..\n')
+    worktree_dir = repo_dir / branch
+    worktree_dir.mkdir()
+    (worktree_dir / '.git').write_text('gitdir: {}\n'.format(worktree_git_dir))
+    (worktree_git_dir / 'gitdir').write_text('{}\n'.format(worktree_dir / '.git'))
+    return worktree_dir
+
+
+def write_project(project_dir, repo_name, dependencies, branch):
+    colcon_pkg = 'name: {}\ntype: cmake\n'.format(repo_name)
+    if dependencies:
+        colcon_pkg += 'dependencies: [{}]\n'.format(', '.join(dependencies))
+    (project_dir / 'colcon.pkg').write_text(colcon_pkg)
+    # An empty mapping, as a key without value is None and devloy expects a mapping.
+    repos = 'repositories:\n' if dependencies else 'repositories: {}\n'
+    for dependency in dependencies:
+        repos += '  {}:\n    type: git\n    url: https://git.example.com/{}.git\n    version: {}\n'.format(
+                dependency, dependency, branch)
+    (project_dir / '{}.repos'.format(repo_name)).write_text(repos)
+
+
+def write_database(database_path, repo_dir, build_dir, num_entries):
+    database_path.parent.mkdir(parents=True, exist_ok=True)
+    entries = []
+    for i in range(num_entries):
+        source = '{}/src/file{}.cpp'.format(repo_dir, i)
+        entries.append({
+            'directory': str(build_dir),
+            'file': source,
+            'command': '/usr/bin/c++ -I{0}/include -I{1}/install/include -O2 -g -std=c++17 '
+                       '-o CMakeFiles/lib.dir/src/file{2}.cpp.o -c {3}'.format(repo_dir, build_dir.parent.parent, i,
+                                                                               source)
+            })
+    with open(database_path, 'w', encoding='utf-8') as database:
+        json.dump(entries, database, indent=2)
+
+
+def generate_workspace(root, num_repos, num_deps, num_worktrees, num_entries, seed):
+    """
+    :returns: search path of the repositories, directory of the main project
+    """
+    rng = random.Random(seed)
+    search_path = root / 'repos'
+    names = ['repo{}'.format(i) for i in range(num_repos)]
+
+    for i, name in enumerate(names):
+        repo_dir = search_path / name
+        main_dir = repo_dir / MAIN_BRANCH
+        main_dir.mkdir(parents=True)
+        write_git_dir(main_dir / '.git', name, MAIN_BRANCH)
+        # Dependencies only on later repositories, so the graph has no cycles and the first one reaches most of them.
+        candidates = names[i + 1:]
+        dependencies = rng.sample(candidates, min(num_deps, len(candidates)))
+        write_project(main_dir, name, dependencies, MAIN_BRANCH)
+        for worktree in range(num_worktrees):
+            branch = 'feature{}'.format(worktree)
+            write_project(add_worktree(repo_dir, name, branch), name, dependencies, MAIN_BRANCH)
+
+    main_project_dir = search_path / names[0] / MAIN_BRANCH
+    build_dir = main_project_dir / 'build'
+    for name in names:
+        write_database(build_dir / name / 'compile_commands.json', search_path / name / MAIN_BRANCH,
+                       build_dir / name, num_entries)
+
+    return search_path, main_project_dir
+
+
+def measure(function, repeat):
+    """
+    :returns: statistics of the elapsed seconds, and the result of the last call.
+    """
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return {
+        'repeat': repeat,
+        'min': min(times),
+        'median': statistics.median(times),
+        'mean': statistics.mean(times),
+        'max': max(times),
+        }, result
+
+
+def resolve_projects(logger, search_path, index=None):
+    projects_info = ProjectsInfo(logger, False, [], [str(search_path)], index=index)
+    projects_info.get_main_project_info()
+    return projects_info.get_projects_info()
+
+
+def benchmark_devloy(logger, search_path, workspace_dir, repeat):
+    results = {}
+    results['projects_info'], info = measure(lambda: resolve_projects(logger, search_path), repeat)
+    results['projects_info']['projects'] = len(info)
+    index_path = search_path.parent / 'search-paths.json'
+    index = SearchPathsIndex([search_path], index_path)
+    index.refresh()
+    index.save()
+    results['projects_info_indexed'], _ = measure(
+            lambda: resolve_projects(logger, search_path, SearchPathsIndex([search_path], index_path)), repeat)
+
+    defaults = Defaults()
+    defaults.search_paths = [str(search_path)]
+    defaults.docker = DockerDefaults()
+    defaults.docker.build_dir = str(workspace_dir.parent / 'container-build')
+    defaults.docker.install_dir = str(workspace_dir.parent / 'container-install')
+    command = StartCommand('dev_benchmark', 'ubuntu:latest', logger, defaults, False, False)
+    # An empty snapshot instead of querying docker.
+    command.snapshot = ContainerSnapshot([])
+    results['prepare_call'], docker_args = measure(lambda: command.prepare_call(info), repeat)
+    results['prepare_call']['arguments'] = len(docker_args)
+    return results
+
+
+def run_ccdb(arguments, full):
+    ccdb_core.options = ccdb_core.parse_arguments(arguments)
+    ccdb_core.manifest = Manifest('build', full)
+    return ccdb_core.generate_compile_command()
+
+
+def benchmark_ccdb(logger, search_path, repeat, jobs):
+    ccdb_core.logger = logger
+    mappings = [(str(search_path) + '/', '/home/user/workspace/src/')]
+    results = {}
+
+    def pipeline(arguments, full):
+        list_project_dirs = run_ccdb(arguments, full)
+        ccdb_core.rewrite_compile_command(list_project_dirs, mappings)
+
+    arguments = ['--jobs', str(jobs)]
+    results['generate_full'], _ = measure(lambda: run_ccdb(arguments, True), repeat)
+    results['pipeline_full'], _ = measure(lambda: pipeline(arguments, True), repeat)
+    results['pipeline_incremental'], _ = measure(lambda: pipeline(arguments, False), repeat)
+    results['pipeline_full_mmap'], _ = measure(lambda: pipeline(arguments + ['--mmap'], True), repeat)
+    results['pipeline_full_dedup'], _ = measure(lambda: pipeline(arguments + ['--dedup'], True), repeat)
+    results['database_size'] = os.path.getsize(ccdb_core.DATABASE_NAME)
+    return results
+
+
+def parse_arguments(args):
+    parser = argparse.ArgumentParser(description='Benchmark devloy and ccdb over a synthetic workspace')
+    parser.add_argument('--repos', type=int, default=50, help='Number of repositories (default: %(default)s).')
+    parser.add_argument('--deps', type=int, default=4,
+                        help='Dependencies of each repository (default: %(default)s).')
+    parser.add_argument('--worktrees', type=int, default=1,
+                        help='Extra worktrees of each repository (default: %(default)s).')
+    parser.add_argument('--entries', type=int, default=100,
+                        help='Entries of each package compile command database (default: %(default)s).')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs of each benchmark (default: %(default)s).')
+    parser.add_argument('--jobs', type=int, default=1, help='ccdb --jobs value (default: %(default)s).')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the dependency graph (default: %(default)s).')
+    parser.add_argument('--workspace', help='Directory where the workspace is generated. It must not exist. \
+                        By default a temporary directory removed at the end.')
+    parser.add_argument('--output', help='Write the results to this file instead of stdout.')
+    return parser.parse_args(args)
+
+
+def main(argv=None):
+    args = parse_arguments(argv)
+    logger = logging.getLogger('benchmark')
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+
+    if args.workspace:
+        root = Path(args.workspace).absolute()
+        root.mkdir(parents=True)
+    else:
+        root = Path(tempfile.mkdtemp(prefix='devloy-benchmark-'))
+    cwd = os.getcwd()
+    environ = dict(os.environ)
+    # The defaults and the caches of devloy are read from HOME, they must not be the ones of the user.
+    os.environ['HOME'] = str(root / 'home')
+    os.environ['XDG_CACHE_HOME'] = str(root / 'cache')
+    try:
+        start = time.perf_counter()
+        search_path, workspace_dir = generate_workspace(
+                root, args.repos, args.deps, args.worktrees, args.entries, args.seed)
+        generation_time = time.perf_counter() - start
+
+        os.chdir(str(workspace_dir))
+        results = {
+            'parameters': {key: value for key, value in vars(args).items() if key not in ('workspace', 'output')},
+            'python': sys.version.split()[0],
+            'workspace_generation': generation_time,
+            'devloy': benchmark_devloy(logger, search_path, workspace_dir, args.repeat),
+            'ccdb': benchmark_ccdb(logger, search_path, args.repeat, args.jobs),
+            }
+    finally:
+        os.chdir(cwd)
+        os.environ.clear()
+        os.environ.update(environ)
+        if not args.workspace:
+            shutil.rmtree(str(root), ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output:
+            json.dump(results, output, indent=2)
+            output.write('\n')
+    else:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    sys.exit(main() or 0)
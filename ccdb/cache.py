@@ -0,0 +1,77 @@
+# Copyright 2020 Ricardo González
+# Licensed under the Apache License, Version 2.0
+
+"""
+Persistent cache of the worktree configuration of colcon packages.
+"""
+import os
+
+from devloy import git
+from devloy.cache import FileCache, cache_dir
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+class WorktreeCache:
+    """
+    Map a colcon package of the current workspace to its (git_dir, branch, rest_of_dir) tuple and its source
+    directory. An entry is invalidated when the .git of its worktree or its HEAD changes.
+    """
+
+    def __init__(self, path=None):
+        self.file_cache = FileCache(path if path else cache_dir('ccdb') / 'worktrees.json')
+        self.workspace = os.getcwd()
+
+    def key(self, project_dir):
+        return '{}:{}'.format(self.workspace, project_dir)
+
+    @staticmethod
+    def stamp(git_project_dir):
+        dot_git = os.path.join(git_project_dir, '.git')
+        try:
+            git_dir, common_dir = git.resolve_git_dirs(dot_git)
+        except (OSError, ValueError):
+            return [_mtime(dot_git), None]
+        return [_mtime(dot_git), _mtime(os.path.join(git_dir, 'HEAD'))]
+
+    def get(self, project_dir):
+        """
+        :returns: tuple (project info, source directory) or None if not found or no longer valid.
+        """
+        entry = self.file_cache.get(self.key(project_dir))
+        if entry is None:
+            return None
+        if entry['stamp'] != self.stamp(entry['info'][0]):
+            del self.file_cache[self.key(project_dir)]
+            return None
+        return tuple(entry['info']), entry['source_dir']
+
+    def store(self, project_dir, project_info, source_dir):
+        self.file_cache[self.key(project_dir)] = {
+                'info': list(project_info),
+                'source_dir': source_dir,
+                'stamp': self.stamp(project_info[0])
+                }
+
+    def head_paths(self):
+        """
+        :returns: The HEAD files of the worktrees cached for the current workspace.
+        """
+        head_paths = set()
+        prefix = self.key('')
+        for key, entry in self.file_cache.data.items():
+            if key.startswith(prefix):
+                try:
+                    git_dir, common_dir = git.resolve_git_dirs(os.path.join(entry['info'][0], '.git'))
+                except (OSError, ValueError):
+                    continue
+                head_paths.add(os.path.join(git_dir, 'HEAD'))
+        return sorted(head_paths)
+
+    def close(self):
+        self.file_cache.close()
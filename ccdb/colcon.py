@@ -0,0 +1,118 @@
+# Copyright 2020 Ricardo González
+# Licensed under the Apache License, Version 2.0
+
+"""
+Index of the colcon packages of the workspace: package name -> (path, type).
+It is built from the output of `colcon list`, or discovering the packages natively when colcon is not available.
+"""
+import os
+import re
+import shutil
+import subprocess
+import xml.etree.ElementTree as ElementTree
+
+from devloy import timing
+
+IGNORED_DIRS = ('build', 'install', 'log')
+
+_cmake_project_regex = re.compile(r'^\s*project\s*\(\s*([A-Za-z0-9_.+-]+)', re.IGNORECASE | re.MULTILINE)
+
+
+class ColconIndex:
+    def __init__(self, packages):
+        self.packages = packages
+
+    def __contains__(self, name):
+        return name in self.packages
+
+    def __len__(self):
+        return len(self.packages)
+
+    def get(self, name):
+        """
+        :returns: tuple (path, type) or None
+        """
+        return self.packages.get(name)
+
+    @classmethod
+    def parse_colcon_list(cls, lines):
+        packages = {}
+        for line in lines:
+            fields = line.rstrip('\n').split('\t')
+            if 3 == len(fields):
+                packages[fields[0]] = (fields[1], fields[2])
+        return cls(packages)
+
+    @classmethod
+    def from_colcon_list(cls):
+        """
+        :returns: The index built from `colcon list`, or None if it failed.
+        """
+        timing.count('subprocesses')
+        with timing.span('colcon list', 'ccdb'):
+            colcon_list_proc = subprocess.run(['colcon', 'list'], stdout=subprocess.PIPE)
+        if 0 != colcon_list_proc.returncode:
+            return None
+        return cls.parse_colcon_list(colcon_list_proc.stdout.decode('utf-8').splitlines())
+
+    @classmethod
+    def discover(cls, base_path='.'):
+        """
+        Find the packages like colcon does: directories with a colcon.pkg, package.xml or CMakeLists.txt, not descending
+        into packages nor into directories with a COLCON_IGNORE file. Symbolic links are followed, each directory is
+        visited once.
+        """
+        packages = {}
+        visited = set()
+        for root, dirs, files in os.walk(base_path, followlinks=True):
+            real_root = os.path.realpath(root)
+            if 'COLCON_IGNORE' in files or real_root in visited:
+                dirs[:] = []
+                continue
+            visited.add(real_root)
+            package = identify_package(root, files)
+            if package:
+                name, package_type = package
+                packages.setdefault(name, (os.path.normpath(root), package_type))
+                dirs[:] = []
+                continue
+            dirs[:] = sorted(d for d in dirs if not d.startswith('.') and
+                             not (root == base_path and d in IGNORED_DIRS))
+        return cls(packages)
+
+    @classmethod
+    def load(cls, native=False):
+        if not native and shutil.which('colcon'):
+            index = cls.from_colcon_list()
+            if index is not None:
+                return index
+        return cls.discover()
+
+
+def identify_package(path, files):
+    """
+    :returns: tuple (name, type) or None if path is not a package.
+    """
+    if 'colcon.pkg' in files:
+        import yaml
+
+        with open(os.path.join(path, 'colcon.pkg'), 'r', encoding='utf-8') as colcon_pkg:
+            content = yaml.safe_load(colcon_pkg)
+        if isinstance(content, dict) and 'name' in content:
+            return content['name'], '({})'.format(content.get('type', 'cmake'))
+    if 'package.xml' in files:
+        try:
+            root = ElementTree.parse(os.path.join(path, 'package.xml')).getroot()
+        except ElementTree.ParseError:
+            root = None
+        if root is not None and root.findtext('name'):
+            build_type = root.findtext('export/build_type')
+            if not build_type:
+                build_type = 'catkin' if root.find('buildtool_depend[.="catkin"]') is not None else 'cmake'
+            return root.findtext('name').strip(), '(ros.{})'.format(build_type.strip())
+    if 'CMakeLists.txt' in files:
+        with open(os.path.join(path, 'CMakeLists.txt'), 'r', encoding='utf-8', errors='replace') as cmake_lists:
+            match = _cmake_project_regex.search(cmake_lists.read())
+        if match:
+            return match.group(1), '(cmake)'
+    return None
@@ -6,17 +6,30 @@ This command generates an unique compile command database from a collective cons
 Also it is able to manage git worktree environments.
 """
 import argparse
+import concurrent.futures
 import glob
+import json
 import logging
 import os
-import shutil
-import subprocess
 from pathlib import Path
 
-# from fcache.cache import FileCache
+from devloy import git, timing
+
+from .cache import WorktreeCache
+from .colcon import ColconIndex
+from .database import (DATABASE_NAME, concatenate_fragments, deduplicate_fragments, find_databases, iter_entries,
+                       write_fragment)
+from .distribute import distribute
+from .index import INDEX_SUFFIX, entry_file, lookup
+from .manifest import Manifest
+from .partition import ProjectPartitioner, write_project_databases
+from .rewrite import PathRewriter, rewrite_file_mmap
+from .watch import Watcher
 
 cache = None
 logger = None
+manifest = None
+options = None
 
 
 def parse_arguments(args):
@@ -27,6 +40,88 @@ def parse_arguments(args):
             action='store_true',
             help='Print debug info.'
     )
+    parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Ignore the manifest of previous runs and regenerate the whole database.'
+    )
+    parser.add_argument(
+            '--mmap',
+            action='store_true',
+            help='Rewrite paths scanning the memory-mapped database bytes instead of decoding its entries. \
+                    All occurrences are rewritten, not only the ones in path fields.'
+    )
+    parser.add_argument(
+            '-j',
+            '--jobs',
+            type=int,
+            default=1,
+            help='Number of processes rewriting the package databases in parallel. 0 uses one per CPU \
+                    (default: %(default)s).'
+    )
+    parser.add_argument(
+            '--hardlink',
+            action='store_true',
+            help='Distribute the database as hardlinks when the filesystem does not support reflinks, instead of \
+                    copies. All the projects share then the same file, so editing one of them changes the others.'
+    )
+    parser.add_argument(
+            '--dedup',
+            action='store_true',
+            help='Keep only the newest entry of each source file and directory, drop the command of entries with \
+                    arguments and write the databases without whitespace.'
+    )
+    parser.add_argument(
+            '-w',
+            '--watch',
+            action='store_true',
+            help='Keep running and update the database every time a package database changes.'
+    )
+    parser.add_argument(
+            '--poll',
+            action='store_true',
+            help='When watching, poll for changes instead of using inotify.'
+    )
+    parser.add_argument(
+            '--native-discovery',
+            action='store_true',
+            help='Discover the colcon packages scanning the workspace instead of calling `colcon list`.'
+    )
+    parser.add_argument(
+            '-p',
+            '--per-project',
+            action='store_true',
+            help='Copy to each project only its own entries instead of the whole database (needs \
+                    CCDB_WORKTREE_APPLICATION).'
+    )
+    parser.add_argument(
+            '--deps',
+            nargs='*',
+            default=[],
+            help='Projects whose entries are included in every project database when using --per-project. \
+                    A project can be given by its name or its directory.'
+    )
+    parser.add_argument(
+            '--profile',
+            action='store_true',
+            help='Time the phases of the command and print a summary to stderr.'
+    )
+    parser.add_argument(
+            '--profile-output',
+            metavar='TRACE_FILE',
+            help='With --profile, write a Chrome trace-event JSON file instead of the summary.'
+    )
+    subparsers = parser.add_subparsers(dest='verb', help='verbs help')
+    lookup_parser = subparsers.add_parser('lookup', help='Print the entries of a file in the compile command database.')
+    lookup_parser.add_argument(
+            'file',
+            help='Source file to look up.'
+    )
+    lookup_parser.add_argument(
+            '--database',
+            default=DATABASE_NAME,
+            help='Compile command database generated by ccdb (default: %(default)s).'
+    )
     options = vars(parser.parse_args(args))
 
     # Set log level
@@ -35,49 +130,122 @@ def parse_arguments(args):
     else:
         logger.setLevel(logging.INFO)
 
+    if options['profile'] or options['profile_output']:
+        timing.enable(options['profile_output'] or timing.SUMMARY)
+
+    return options
+
+
+@timing.timed('join', 'ccdb')
+def join_fragments(list_project_dirs, kind, output_path, index=False):
+    """
+    Join the fragments of the packages in output_path.
+    With --dedup, fragments of the most recently built packages go first so their entries win.
+    """
+    global manifest, options
+
+    if options['dedup']:
+        list_project_dirs = sorted(
+                list_project_dirs, key=lambda project_dir: manifest.packages[project_dir]['mtime'], reverse=True)
+        num_discarded = deduplicate_fragments(
+                [manifest.fragment_path(project_dir, kind) for project_dir in list_project_dirs],
+                output_path, index=index)
+        logger.debug('\t{}: {} duplicated entries discarded'.format(output_path, num_discarded))
+    else:
+        concatenate_fragments(
+                [manifest.fragment_path(project_dir, kind) for project_dir in list_project_dirs],
+                output_path, index=index)
+
 
+@timing.timed('generate', 'ccdb')
 def generate_compile_command():
-    # Generate the compile_commands.json
-    find_proc = subprocess.Popen(
-            'find build -iname compile_commands.json -print0 | grep -z . | xargs -0',
-            stdout=subprocess.PIPE, shell=True)
-    find_proc.wait()
-    list_files = find_proc.stdout.readline().decode('utf-8').rstrip()
-    find_proc.communicate()
-    retcode = find_proc.returncode
-
-    if retcode == 0 and len(list_files) > 0:
-        subprocess.call('jq -s add {} > compile_commands.json'.format(list_files), shell=True)
-        list_project_dirs = list_files.replace('build/', '').replace('/compile_commands.json', '').split()
-        for project_dir in list_project_dirs:
-            logger.debug('\tproject: {}'.format(project_dir))
-        return list_project_dirs
+    """
+    Generate the compile_commands.json.
+    Only the per-package databases changed since last run are merged again.
+    """
+    global manifest
 
-    return None
+    databases = find_databases('build')
+    if not databases:
+        return None
 
+    os.makedirs(manifest.manifest_dir, exist_ok=True)
+    list_project_dirs = [database[0] for database in databases]
+    modified = manifest.remove_missing(set(list_project_dirs))
 
-def get_project_from_colcon():
-    global logger
-    logger.debug('Getting projects from colcon list')
-    colcon_list = []
-    # Get list of project from command 'colcon list'.
-    colcon_list_proc = subprocess.Popen(
-            'colcon list',
-            stdout=subprocess.PIPE, shell=True)
-    colcon_list_proc.wait()
-    project_info = colcon_list_proc.stdout.readline()
-    while project_info:
-        logger.debug('\tproject: {}'.format(project_info.decode('utf-8').rstrip()))
-        colcon_list.append(project_info.decode('utf-8').rstrip())
-        project_info = colcon_list_proc.stdout.readline()
-
-    colcon_list_proc.communicate()
-    retcode = colcon_list_proc.returncode
-
-    if retcode == 0:
-        return colcon_list
+    for project_dir, database_path in databases:
+        if manifest.is_unchanged(project_dir, database_path):
+            logger.debug('\tproject: {} (unchanged)'.format(project_dir))
+        else:
+            with timing.span('write_fragment', 'ccdb'):
+                num_entries = write_fragment(database_path, manifest.fragment_path(project_dir, 'merged'), index=True)
+            timing.count('entries merged', num_entries)
+            manifest.update(project_dir, database_path)
+            modified = True
+            logger.debug('\tproject: {} ({} entries)'.format(project_dir, num_entries))
 
-    return None
+    modified = manifest.set_dedup(options['dedup']) or modified
+    if modified or not os.path.isfile(DATABASE_NAME) or not os.path.isfile(DATABASE_NAME + INDEX_SUFFIX):
+        join_fragments(list_project_dirs, 'merged', DATABASE_NAME, index=True)
+    manifest.save()
+
+    return list_project_dirs
+
+
+@timing.timed('rewrite', 'ccdb')
+def rewrite_compile_command(list_project_dirs, mappings):
+    """
+    Generate the ccdb.json applying the path mappings.
+    Only the packages changed since last run, or all of them if the mappings changed, are rewritten again.
+    """
+    global manifest, options
+
+    logger.debug('\tRewriting paths: {}'.format(mappings))
+    rewriter = PathRewriter(mappings)
+    rewrite_key = rewriter.fingerprint()
+    if options['mmap']:
+        rewrite_key += ':mmap'
+
+    tasks = []
+    for project_dir in list_project_dirs:
+        if not manifest.is_rewritten(project_dir, rewrite_key):
+            if options['mmap']:
+                tasks.append((project_dir, rewrite_file_mmap, (
+                        rewriter,
+                        manifest.fragment_path(project_dir, 'merged'),
+                        manifest.fragment_path(project_dir, 'rewritten'))))
+            else:
+                tasks.append((project_dir, write_fragment, (
+                        manifest.packages[project_dir]['path'],
+                        manifest.fragment_path(project_dir, 'rewritten'),
+                        rewriter.rewrite_entry)))
+
+    jobs = options['jobs'] if options['jobs'] > 0 else os.cpu_count()
+    if jobs > 1 and len(tasks) > 1:
+        # Every package is rewritten in its own fragment, so they don't depend on each other.
+        with concurrent.futures.ProcessPoolExecutor(max_workers=min(jobs, len(tasks))) as executor:
+            futures = {executor.submit(function, *args): project_dir for project_dir, function, args in tasks}
+            for future in concurrent.futures.as_completed(futures):
+                future.result()
+                manifest.set_rewritten(futures[future], rewrite_key)
+    else:
+        for project_dir, function, args in tasks:
+            function(*args)
+            manifest.set_rewritten(project_dir, rewrite_key)
+
+    timing.count('packages rewritten', len(tasks))
+    join_fragments(list_project_dirs, 'rewritten', 'ccdb.json')
+    manifest.save()
+
+
+@timing.timed('colcon packages', 'ccdb')
+def get_project_from_colcon():
+    global logger, options
+    logger.debug('Getting projects from colcon')
+    colcon_index = ColconIndex.load(options['native_discovery'])
+    for name in sorted(colcon_index.packages):
+        logger.debug('\tproject: {}\t{}\t{}'.format(name, *colcon_index.get(name)))
+    return colcon_index
 
 
 def find_git_directory(base_dir):
@@ -105,20 +273,12 @@ def get_worktree_for_project(project_info):
 
     # Get branch for the project
     if git_dir.is_file():
-        git_dir_file = open(git_dir, 'r')
-        git_worktree_dir = git_dir_file.readline()
-        git_worktree_dir = git_worktree_dir.replace('gitdir:', '').rstrip()
+        git_worktree_dir, git_common_dir = git.resolve_git_dirs(str(git_dir))
         project_branch = Path(git_worktree_dir).name
     else:
-        git_proc = subprocess.Popen(
-                'cd {} && git branch'.format(project_info[1]),
-                stdout=subprocess.PIPE, shell=True)
-        git_proc.wait()
-        project_branch = git_proc.stdout.readline().decode('utf-8').rstrip()
-        git_proc.communicate()
-        retcode = git_proc.returncode
-
-        if retcode != 0:
+        project_branch = git.current_branch(project_info[1])
+
+        if project_branch is None:
             logger.debug("Warning: cannot get Git branch for project {}".format(project_info[0]))
             return None
 
@@ -139,86 +299,198 @@ def get_worktree_for_project(project_info):
     return (git_project_dir, project_branch, rest_of_project_dir)
 
 
+@timing.timed('distribute', 'ccdb')
+def copy_to_projects(dirs_to_copy):
+    global manifest, options
+
+    logger.debug('Distributing compile command database')
+    distribute('ccdb.json', [dir_to_copy + '/' + DATABASE_NAME for dir_to_copy in dirs_to_copy],
+               manifest.targets, logger, options['hardlink'])
+    manifest.changed = True
+    manifest.save()
+    os.remove('ccdb.json')
+
+
+@timing.timed('distribute', 'ccdb')
+def copy_project_databases(mappings, dirs_to_copy):
+    """
+    Copy to each project a database with its own entries and the entries of the dependencies chosen by the user.
+    """
+    global manifest, options
+
+    logger.debug('Distributing per project compile command databases')
+    # Entries are already rewritten, so they are matched against the destination of the mappings.
+    prefixes = {}
+    deps = set()
+    for origin, dest in mappings:
+        project = origin.rstrip('/')
+        prefixes[dest] = project
+        if (project in options['deps'] or dest.rstrip('/') in options['deps'] or
+                os.path.basename(project) in options['deps']):
+            deps.add(project)
+
+    projects = set(dirs_to_copy)
+    project_databases = write_project_databases(
+            'ccdb.json', ProjectPartitioner(prefixes), projects, deps,
+            os.path.join(manifest.manifest_dir, 'projects'))
+    for project, project_database in project_databases.items():
+        # The project database is removed after, so the target can be a hardlink without sharing its file.
+        distribute(project_database, [project + '/' + DATABASE_NAME], manifest.targets, logger, hardlink=True)
+        os.remove(project_database)
+    # The database distributed by a previous run to a project which has no entries now is stale.
+    for project in projects.difference(project_databases):
+        target_path = os.path.realpath(project + '/' + DATABASE_NAME)
+        if manifest.targets.pop(target_path, None) is not None and os.path.isfile(target_path):
+            logger.debug('\tRemoved {}'.format(target_path))
+            os.remove(target_path)
+    manifest.changed = True
+    manifest.save()
+    os.remove('ccdb.json')
+
+
+@timing.timed('worktree env', 'ccdb')
 def apply_worktree_env(list_project_dirs):
     global cache
 
-    colcon_list = None
-    sed_arguments = []
+    colcon_index = None
+    mappings = []
     dirs_to_copy = []
 
     for project_dir in list_project_dirs:
         # Search in cache.
-        if project_dir in cache:
-            project_info = cache[project_dir]
+        cached = cache.get(project_dir)
+        if cached:
+            project_info, source_dir = cached
             logger.debug('Retrieved from cache: {} - {}'.format(
                 project_dir,
                 project_info
             ))
+            dirs_to_copy.append(source_dir)
 
         else:
-            if not colcon_list:
-                colcon_list = get_project_from_colcon()
-            project_info_l = list(filter(lambda proj: project_dir + '\t' in proj, colcon_list))
-            project_info_l = ''.join(project_info_l).split('\t')
-            dirs_to_copy.append(project_info_l[1])
-            project_info = get_worktree_for_project(project_info_l)
+            if colcon_index is None:
+                colcon_index = get_project_from_colcon()
+            colcon_package = colcon_index.get(project_dir)
+            if colcon_package is None:
+                logger.debug('Warning: project {} not found in colcon packages'.format(project_dir))
+                continue
+            source_dir = colcon_package[0]
+            dirs_to_copy.append(source_dir)
+            project_info = get_worktree_for_project((project_dir,) + colcon_package)
+
+            if project_info:
+                # Update cache
+                logger.debug('Storing in cache: {} - {}'.format(
+                    project_dir,
+                    project_info
+                ))
+                cache.store(project_dir, project_info, source_dir)
 
         if project_info:
-            sed_arguments.append('-e')
-            sed_arguments.append('s+{}{}+{}/{}{}+g'.format(
-                project_info[0],
-                project_info[2],
-                project_info[0],
-                project_info[1],
-                project_info[2]
+            mappings.append((
+                '{}{}'.format(project_info[0], project_info[2]),
+                '{}/{}{}'.format(project_info[0], project_info[1], project_info[2])
             ))
             dirs_to_copy.append(project_info[0])
-            # Update cache
-            logger.debug('Storing in cache: {} - {}'.format(
-                project_dir,
-                project_info
-            ))
-            cache[project_dir] = project_info
 
-    logger.debug('\tCalling sed argument: {}'.format(
-        ' '.join(['sed'] + sed_arguments + ['compile_commands.json', '>', 'ccdb.json'])
-    ))
-    subprocess.call(' '.join(['sed'] + sed_arguments + ['compile_commands.json', '>', 'ccdb.json']), shell=True)
+    rewrite_compile_command(list_project_dirs, mappings)
 
     # Copy compile command database to all projects
-    dirs_to_copy = set(dirs_to_copy)
-    for dir_to_copy in dirs_to_copy:
-        shutil.copy2('ccdb.json', dir_to_copy + '/compile_commands.json')
-    os.remove('ccdb.json')
+    copy_to_projects(dirs_to_copy)
 
 
-def apply_worktree_env_using_envvar(env_var):
+def apply_worktree_env_using_envvar(list_project_dirs, env_var):
     dirs_to_copy = []
     list_substitutions = env_var.split(',')
-    sed_arguments = []
+    mappings = []
 
     for substitution in list_substitutions:
         directories = substitution.split(':')
         if 2 == len(directories) and directories[0] != '' and directories[1] != '':
             origin = directories[1]
             dest = directories[0]
-            sed_arguments.append('-e')
-            sed_arguments.append('s+{}/+{}/+g'.format(origin, dest))
+            mappings.append((origin + '/', dest + '/'))
             if 'build' != origin[len(origin) - 5: len(origin)] and 'install' != origin[len(origin) - 7: len(origin)]:
                 dirs_to_copy.append(directories[1])
 
-    command = ' '.join(
-            ['sed'] +
-            sed_arguments +
-            ['compile_commands.json', '>', 'ccdb.json'])
-    logger.debug('\tCalling sed argument: {}'.format(command))
-    subprocess.call(command, shell=True)
+    rewrite_compile_command(list_project_dirs, mappings)
 
     # Copy compile command database to all projects
-    dirs_to_copy = set(dirs_to_copy)
-    for dir_to_copy in dirs_to_copy:
-        shutil.copy2('ccdb.json', dir_to_copy + '/compile_commands.json')
-    os.remove('ccdb.json')
+    if options['per_project']:
+        copy_project_databases(mappings, dirs_to_copy)
+    else:
+        copy_to_projects(dirs_to_copy)
+
+
+def lookup_compile_command(database_path, file_path):
+    """
+    Print the entries of a file, seeking directly to them if the database has a valid index.
+    :returns: The return code
+    """
+    try:
+        entries = lookup(database_path, file_path)
+        if entries is None:
+            logger.debug('No valid index for {}, scanning the database'.format(database_path))
+            file_path = os.path.normpath(os.path.abspath(file_path))
+            entries = [entry for entry in iter_entries(database_path) if entry_file(entry) == file_path]
+    except FileNotFoundError:
+        logger.error('Compile command database {} not found'.format(database_path))
+        return 1
+
+    if not entries:
+        logger.error('{} not found in {}'.format(file_path, database_path))
+        return 1
+
+    print(json.dumps(entries, indent=2))
+    return 0
+
+
+def update_compile_command(ccdb_worktree_env, ccdb_worktree_apply_env):
+    """
+    Generate the unique compile command database and apply the worktree configuration to it.
+    """
+    global cache
+
+    # Generate unique compile command database
+    logger.debug('Generating compile command database')
+    list_project_dirs = generate_compile_command()
+
+    if not list_project_dirs:
+        return
+
+    if ccdb_worktree_env is not None:
+        if ccdb_worktree_apply_env:
+            apply_worktree_env_using_envvar(list_project_dirs, ccdb_worktree_apply_env)
+        else:
+            # Load cache
+            cache = WorktreeCache()
+            logger.debug('Applying worktree configuration to compile command database')
+            apply_worktree_env(list_project_dirs)
+            cache.close()
+
+
+def watch_compile_command(ccdb_worktree_env, ccdb_worktree_apply_env):
+    """
+    Update the compile command database every time a package database changes or, when using the worktree cache,
+    the HEAD of a worktree changes.
+    """
+    extra_files = []
+    if ccdb_worktree_env is not None and not ccdb_worktree_apply_env:
+        extra_files = WorktreeCache().head_paths()
+
+    def update():
+        try:
+            update_compile_command(ccdb_worktree_env, ccdb_worktree_apply_env)
+        except Exception as error:
+            # E.g. a package database truncated by an interrupted build. Its next change updates it again.
+            logger.error('Cannot update the compile command database: {}'.format(error))
+
+    watcher = Watcher('build', extra_files, use_polling=options['poll'])
+    logger.info('Watching for changes ({})'.format('inotify' if watcher.inotify else 'polling'))
+    try:
+        watcher.run(update)
+    except KeyboardInterrupt:
+        pass
 
 
 def main(argv=None):
@@ -226,8 +498,9 @@ def main(argv=None):
     Logic:
         * Generate the unique compile command database.
         * Get worktree branches and changes urls in compile command database
+        * If watching, repeat each time a per-package database changes.
     """
-    global logger, cache
+    global logger, cache, manifest, options
 
     # Getting environment variables
     ccdb_worktree_env = os.environ.get('CCDB_WORKTREE')
@@ -245,23 +518,14 @@ def main(argv=None):
     logger.addHandler(c_handler)
 
     # Parse arguments
-    parse_arguments(args=argv)
+    options = parse_arguments(args=argv)
+    if 'lookup' == options['verb']:
+        return lookup_compile_command(options['database'], options['file'])
 
-    # Generate unique compile command database
-    logger.debug('Generating compile command database')
-    list_project_dirs = generate_compile_command()
+    manifest = Manifest('build', options['full'])
 
-    if not list_project_dirs:
-        exit(0)
+    update_compile_command(ccdb_worktree_env, ccdb_worktree_apply_env)
+    timing.report()
 
-    if ccdb_worktree_env is not None:
-        if ccdb_worktree_apply_env:
-            apply_worktree_env_using_envvar(ccdb_worktree_apply_env)
-        #else:
-        #    # Load cache
-        #    cache = FileCache('ccdb')
-        #    logger.debug('Applying worktree configuration to compile command database')
-        #    apply_worktree_env(list_project_dirs)
-        #    cache.close()
-
-# Copiar a todos los projectos o solo al dicho por la variable de entorno
+    if options['watch']:
+        watch_compile_command(ccdb_worktree_env, ccdb_worktree_apply_env)
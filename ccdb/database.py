@@ -0,0 +1,234 @@
+# Copyright 2020 Ricardo González
+# Licensed under the Apache License, Version 2.0
+
+"""
+Streaming access to compile command databases.
+Entries are read and written one by one, so memory is bounded by the biggest entry and not by the database size.
+"""
+import json
+import os
+import shutil
+import sys
+
+from .index import INDEX_SUFFIX, pack_record, write_index
+
+DATABASE_NAME = 'compile_commands.json'
+READ_CHUNK_SIZE = 1024 * 1024
+
+_decoder = json.JSONDecoder()
+_whitespace = ' \t\n\r'
+
+
+def find_databases(build_dir='build'):
+    """
+    Find all the per-package compile command databases under the build directory.
+    :returns: sorted list of tuples (project dir relative to build_dir, database path)
+    """
+    databases = []
+    for root, dirs, files in os.walk(build_dir):
+        dirs.sort()
+        for file_name in files:
+            if file_name.lower() == DATABASE_NAME:
+                database_path = os.path.join(root, file_name)
+                if os.path.getsize(database_path) > 0:
+                    databases.append((os.path.relpath(root, build_dir), database_path))
+    return databases
+
+
+def iter_entries(database_path):
+    """
+    Iterate over the entries of a compile command database without loading the whole file.
+    """
+    with open(database_path, 'r', encoding='utf-8') as database:
+        buffer = ''
+        pos = 0
+        eof = False
+        started = False
+
+        while True:
+            # Skip whitespace, reading more data when the buffer is consumed.
+            while True:
+                while pos < len(buffer) and buffer[pos] in _whitespace:
+                    pos += 1
+                if pos < len(buffer) or eof:
+                    break
+                chunk = database.read(READ_CHUNK_SIZE)
+                eof = not chunk
+                buffer = buffer[pos:] + chunk
+                pos = 0
+
+            if pos == len(buffer):
+                raise ValueError('{}: unexpected end of file'.format(database_path))
+
+            char = buffer[pos]
+            if not started:
+                if char != '[':
+                    raise ValueError('{}: expected a JSON array'.format(database_path))
+                started = True
+                pos += 1
+                continue
+            if char == ']':
+                return
+            if char == ',':
+                pos += 1
+                continue
+
+            try:
+                entry, end = _decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                # The entry is not complete in the buffer yet.
+                chunk = database.read(READ_CHUNK_SIZE)
+                eof = not chunk
+                buffer = buffer[pos:] + chunk
+                pos = 0
+                continue
+
+            yield entry
+            pos = end
+
+
+class DatabaseWriter:
+    """
+    Write a compile command database entry by entry.
+    The database is written to a temporary file which replaces the destination when closed.
+    A fragment is written without the enclosing brackets, to be concatenated later with concatenate_fragments().
+    With index, the offset and length of each entry are recorded in a .idx file next to the database.
+    """
+
+    def __init__(self, database_path, fragment=False, index=False, compact=False):
+        self.database_path = database_path
+        self.fragment = fragment
+        self.separators = (',', ':') if compact else None
+        self.tmp_path = '{}.tmp{}'.format(database_path, os.getpid())
+        self.database = open(self.tmp_path, 'w', encoding='utf-8')
+        self.offset = 0
+        if not self.fragment:
+            self.offset += self.database.write('[\n')
+        self.num_entries = 0
+        self.records = open(self.tmp_path + INDEX_SUFFIX, 'wb') if index else None
+
+    def write(self, entry):
+        if self.num_entries:
+            self.offset += self.database.write(',\n')
+        # Entries are ASCII encoded, so the number of characters is the number of bytes.
+        encoded_entry = json.dumps(entry, separators=self.separators)
+        if self.records:
+            self.records.write(pack_record(entry, self.offset, len(encoded_entry)))
+        self.offset += self.database.write(encoded_entry)
+        self.num_entries += 1
+
+    def close(self):
+        if not self.fragment:
+            self.database.write('\n]\n')
+        self.database.close()
+        os.replace(self.tmp_path, self.database_path)
+        if self.records:
+            self.records.close()
+            os.replace(self.tmp_path + INDEX_SUFFIX, self.database_path + INDEX_SUFFIX)
+
+    def abort(self):
+        self.database.close()
+        os.remove(self.tmp_path)
+        if self.records:
+            self.records.close()
+            os.remove(self.tmp_path + INDEX_SUFFIX)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def write_fragment(database_path, fragment_path, transform=None, index=False):
+    """
+    Stream the entries of a compile command database into a fragment, optionally transforming them.
+    :returns: number of written entries
+    """
+    with DatabaseWriter(fragment_path, fragment=True, index=index) as writer:
+        for entry in iter_entries(database_path):
+            writer.write(transform(entry) if transform else entry)
+    return writer.num_entries
+
+
+def iter_fragment_entries(fragment_path):
+    """
+    Iterate over the entries of a fragment. DatabaseWriter writes one entry per line.
+    """
+    with open(fragment_path, 'r', encoding='utf-8') as fragment:
+        for line in fragment:
+            line = line.rstrip().rstrip(',')
+            if line:
+                yield json.loads(line)
+
+
+def normalize_entry(entry):
+    """
+    Use only the arguments form when present.
+    """
+    if 'arguments' in entry:
+        entry.pop('command', None)
+    return entry
+
+
+def deduplicate_fragments(fragment_paths, output_path, index=False):
+    """
+    Build a compact compile command database joining fragments, keeping only the newest entry of each
+    (file, directory) pair. Fragments have to be given from newest to oldest, and inside a fragment the last entry is
+    the newest one.
+    :returns: number of discarded entries
+    """
+    seen = set()
+    num_discarded = 0
+    with DatabaseWriter(output_path, index=index, compact=True) as writer:
+        for fragment_path in fragment_paths:
+            # Only the entries of one fragment are kept in memory.
+            entries = {}
+            for entry in iter_fragment_entries(fragment_path):
+                key = (sys.intern(entry.get('file', '')), sys.intern(entry.get('directory', '')))
+                if entries.pop(key, None) is not None:
+                    num_discarded += 1
+                entries[key] = entry
+            for key, entry in entries.items():
+                if key in seen:
+                    num_discarded += 1
+                    continue
+                seen.add(key)
+                writer.write(normalize_entry(entry))
+    if index:
+        # The writer left the unsorted records in place of the index.
+        write_index([(output_path + INDEX_SUFFIX, 0)], output_path, output_path + INDEX_SUFFIX)
+    return num_discarded
+
+
+def concatenate_fragments(fragment_paths, output_path, index=False):
+    """
+    Build a compile command database joining fragments. Their content is copied without being decoded.
+    With index, the .idx records of the fragments are merged in the index of the database.
+    """
+    tmp_path = '{}.tmp{}'.format(output_path, os.getpid())
+    record_sources = []
+    with open(tmp_path, 'wb') as output:
+        offset = output.write(b'[\n')
+        first = True
+        for fragment_path in fragment_paths:
+            fragment_size = os.path.getsize(fragment_path)
+            if fragment_size == 0:
+                continue
+            if not first:
+                offset += output.write(b',\n')
+            with open(fragment_path, 'rb') as fragment:
+                shutil.copyfileobj(fragment, output, READ_CHUNK_SIZE)
+            record_sources.append((fragment_path + INDEX_SUFFIX, offset))
+            offset += fragment_size
+            first = False
+        output.write(b'\n]\n')
+    os.replace(tmp_path, output_path)
+
+    if index:
+        write_index(record_sources, output_path, output_path + INDEX_SUFFIX)
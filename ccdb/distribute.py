@@ -0,0 +1,89 @@
+# Copyright 2020 Ricardo González
+# Licensed under the Apache License, Version 2.0
+
+"""
+Distribution of the generated compile command database to the projects.
+Targets whose content is already the same are not touched, so their mtime is kept and clangd does not re-index them.
+Other targets are replaced atomically by a reflink of the database when possible, and by a copy if not. Hardlinks are
+only used if asked to, as all the targets share then the same file.
+"""
+import errno
+import fcntl
+import os
+import shutil
+
+from .manifest import file_digest
+
+# From linux/fs.h: _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+
+
+def _reflink(source_path, tmp_path):
+    with open(source_path, 'rb') as source, open(tmp_path, 'wb') as tmp:
+        try:
+            fcntl.ioctl(tmp.fileno(), FICLONE, source.fileno())
+        except OSError:
+            tmp.close()
+            os.remove(tmp_path)
+            raise
+
+
+def _place(source_path, tmp_path, hardlink=False):
+    """
+    Create tmp_path with the content of source_path, using the cheapest available method.
+    :returns: the used method
+    """
+    try:
+        _reflink(source_path, tmp_path)
+        return 'reflink'
+    except OSError as error:
+        if error.errno not in (errno.EXDEV, errno.EINVAL, errno.ENOTTY, errno.ENOTSUP, errno.EBADF):
+            raise
+    if hardlink:
+        try:
+            os.link(source_path, tmp_path)
+            return 'hardlink'
+        except OSError as error:
+            if error.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP):
+                raise
+    shutil.copy2(source_path, tmp_path)
+    return 'copy'
+
+
+def _target_stamp(target_path):
+    try:
+        stat = os.stat(target_path)
+    except FileNotFoundError:
+        return None
+    return [stat.st_ino, stat.st_mtime_ns, stat.st_size]
+
+
+def distribute(source_path, target_paths, targets_info, logger, hardlink=False):
+    """
+    Place the content of source_path in all target_paths.
+    :param dict targets_info: stamp and digest of the targets in previous runs, updated by this function.
+    :param hardlink: Link the targets to source_path when it cannot be reflinked. Editing one of them in place changes
+        then all of them.
+    """
+    digest = file_digest(source_path)
+    size = os.path.getsize(source_path)
+
+    # The same target can be given by different paths, e.g. relative and absolute.
+    for target_path in sorted({os.path.realpath(target_path) for target_path in target_paths}):
+        stamp = _target_stamp(target_path)
+        if stamp is not None and stamp[2] == size:
+            info = targets_info.get(target_path)
+            if info is not None and info['stamp'] == stamp:
+                target_digest = info['digest']
+            else:
+                target_digest = file_digest(target_path)
+            if target_digest == digest:
+                logger.debug('\tUnchanged {}'.format(target_path))
+                targets_info[target_path] = {'stamp': stamp, 'digest': digest}
+                continue
+
+        tmp_path = '{}.ccdb{}'.format(target_path, os.getpid())
+        method = _place(source_path, tmp_path, hardlink)
+        os.replace(tmp_path, target_path)
+        targets_info[target_path] = {'stamp': _target_stamp(target_path), 'digest': digest}
+        logger.debug('\tUpdated {} ({})'.format(target_path, method))
@@ -0,0 +1,107 @@
+# Copyright 2020 Ricardo González
+# Licensed under the Apache License, Version 2.0
+
+"""
+Sidecar index of a compile command database: hash of each source file -> byte offset and length of its entry.
+A lookup binary-searches the memory-mapped index and reads only the entry, without parsing the database.
+
+Format: header (magic, number of records, size and mtime of the indexed database) followed by records
+(hash, offset, length) sorted by hash.
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+
+INDEX_SUFFIX = '.idx'
+INDEX_MAGIC = b'CCDBIDX1'
+HEADER = struct.Struct('<8sQQQ')
+RECORD = struct.Struct('<QQI')
+
+
+def entry_file(entry):
+    file_path = entry.get('file', '')
+    return os.path.normpath(os.path.join(entry.get('directory', ''), file_path))
+
+
+def hash_file(file_path):
+    return int.from_bytes(hashlib.blake2b(file_path.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def pack_record(entry, offset, length):
+    return RECORD.pack(hash_file(entry_file(entry)), offset, length)
+
+
+def write_index(record_sources, database_path, index_path):
+    """
+    Write the index of a database from its unsorted records.
+    :param record_sources: list of tuples (path of a file with packed records, offset to add to them)
+    """
+    records = []
+    for records_path, base_offset in record_sources:
+        with open(records_path, 'rb') as records_file:
+            data = records_file.read()
+        for file_hash, offset, length in RECORD.iter_unpack(data):
+            records.append((file_hash, base_offset + offset, length))
+    records.sort()
+
+    stat = os.stat(database_path)
+    tmp_path = '{}.tmp{}'.format(index_path, os.getpid())
+    with open(tmp_path, 'wb') as index_file:
+        index_file.write(HEADER.pack(INDEX_MAGIC, len(records), stat.st_size, stat.st_mtime_ns))
+        for record in records:
+            index_file.write(RECORD.pack(*record))
+    os.replace(tmp_path, index_path)
+
+
+def lookup(database_path, file_path):
+    """
+    Find the entries of a source file using the index of the database.
+    :returns: list of entries, or None if there is no valid index.
+    """
+    index_path = database_path + INDEX_SUFFIX
+    try:
+        index_file = open(index_path, 'rb')
+    except FileNotFoundError:
+        return None
+
+    file_path = os.path.normpath(os.path.abspath(file_path))
+    file_hash = hash_file(file_path)
+    entries = []
+
+    with index_file, open(database_path, 'rb') as database:
+        header = index_file.read(HEADER.size)
+        if len(header) < HEADER.size:
+            return None
+        magic, num_records, size, mtime = HEADER.unpack(header)
+        stat = os.fstat(database.fileno())
+        if magic != INDEX_MAGIC or size != stat.st_size or mtime != stat.st_mtime_ns:
+            return None
+        if 0 == num_records:
+            return entries
+
+        with mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ) as index:
+            def record_at(position):
+                return RECORD.unpack_from(index, HEADER.size + position * RECORD.size)
+
+            low, high = 0, num_records
+            while low < high:
+                middle = (low + high) // 2
+                if record_at(middle)[0] < file_hash:
+                    low = middle + 1
+                else:
+                    high = middle
+
+            while low < num_records:
+                record_hash, offset, length = record_at(low)
+                if record_hash != file_hash:
+                    break
+                database.seek(offset)
+                entry = json.loads(database.read(length))
+                # Discard hash collisions.
+                if entry_file(entry) == file_path:
+                    entries.append(entry)
+                low += 1
+
+    return entries
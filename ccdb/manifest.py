@@ -0,0 +1,131 @@
+# Copyright 2020 Ricardo González
+# Licensed under the Apache License, Version 2.0
+
+"""
+On-disk manifest used to regenerate the compile command database incrementally.
+For each per-package database it stores its mtime, size and content hash, and keeps under build/.ccdb a fragment with
+its merged entries and another one with its rewritten entries. It also remembers what was distributed to each project.
+"""
+import hashlib
+import json
+import os
+from urllib.parse import quote
+
+from .index import INDEX_SUFFIX
+
+MANIFEST_DIR = '.ccdb'
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_VERSION = 1
+
+
+def file_digest(file_path):
+    digest = hashlib.sha1()
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Manifest:
+    def __init__(self, build_dir='build', full=False):
+        self.manifest_dir = os.path.join(build_dir, MANIFEST_DIR)
+        self.manifest_path = os.path.join(self.manifest_dir, MANIFEST_NAME)
+        self.packages = {}
+        self.targets = {}
+        self.dedup = False
+        self.changed = False
+
+        if not full and os.path.isfile(self.manifest_path):
+            try:
+                with open(self.manifest_path, 'r', encoding='utf-8') as manifest_file:
+                    content = json.load(manifest_file)
+                if content.get('version') == MANIFEST_VERSION:
+                    self.packages = content['packages']
+                    self.targets = content.get('targets', {})
+                    self.dedup = content.get('dedup', False)
+            except (ValueError, KeyError):
+                self.packages = {}
+                self.targets = {}
+
+    def fragment_path(self, project_dir, kind):
+        return os.path.join(self.manifest_dir, '{}.{}'.format(quote(project_dir, safe=''), kind))
+
+    def is_unchanged(self, project_dir, database_path):
+        """
+        Check whether a per-package database is the same than the last time it was merged.
+        The content hash is only calculated when the mtime or the size differ.
+        """
+        stat = os.stat(database_path)
+        package = self.packages.get(project_dir)
+        if (package is None or not os.path.isfile(self.fragment_path(project_dir, 'merged')) or
+                not os.path.isfile(self.fragment_path(project_dir, 'merged') + INDEX_SUFFIX)):
+            return False
+        if package['mtime'] == stat.st_mtime_ns and package['size'] == stat.st_size:
+            return True
+        if package['hash'] != file_digest(database_path):
+            return False
+        package['mtime'] = stat.st_mtime_ns
+        package['size'] = stat.st_size
+        self.changed = True
+        return True
+
+    def update(self, project_dir, database_path):
+        stat = os.stat(database_path)
+        self.packages[project_dir] = {
+                'path': database_path,
+                'mtime': stat.st_mtime_ns,
+                'size': stat.st_size,
+                'hash': file_digest(database_path),
+                'rewrite': None
+                }
+        self.changed = True
+
+    def remove_missing(self, project_dirs):
+        """
+        Forget the packages which no longer have a database.
+        :returns: True if some package was removed.
+        """
+        removed = [project_dir for project_dir in self.packages if project_dir not in project_dirs]
+        for project_dir in removed:
+            del self.packages[project_dir]
+            for kind in ('merged', 'merged' + INDEX_SUFFIX, 'rewritten'):
+                if os.path.isfile(self.fragment_path(project_dir, kind)):
+                    os.remove(self.fragment_path(project_dir, kind))
+        if removed:
+            self.changed = True
+        return 0 < len(removed)
+
+    def is_rewritten(self, project_dir, rewrite_key):
+        package = self.packages.get(project_dir)
+        return (package is not None and package['rewrite'] == rewrite_key and
+                os.path.isfile(self.fragment_path(project_dir, 'rewritten')))
+
+    def set_rewritten(self, project_dir, rewrite_key):
+        self.packages[project_dir]['rewrite'] = rewrite_key
+        self.changed = True
+
+    def set_dedup(self, dedup):
+        """
+        Remember whether the databases were joined deduplicating their entries.
+        :returns: True if it differs from last run.
+        """
+        if self.dedup == dedup:
+            return False
+        self.dedup = dedup
+        self.changed = True
+        return True
+
+    def save(self):
+        if not self.changed:
+            return
+        os.makedirs(self.manifest_dir, exist_ok=True)
+        tmp_path = '{}.tmp{}'.format(self.manifest_path, os.getpid())
+        with open(tmp_path, 'w', encoding='utf-8') as manifest_file:
+            json.dump({
+                'version': MANIFEST_VERSION,
+                'packages': self.packages,
+                'targets': self.targets,
+                'dedup': self.dedup
+                }, manifest_file)
+        os.replace(tmp_path, self.manifest_path)
+        self.changed = False
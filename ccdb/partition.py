@@ -0,0 +1,69 @@
+# Copyright 2020 Ricardo González
+# Licensed under the Apache License, Version 2.0
+
+"""
+Partition of the compile command database by project.
+Each entry belongs to the project whose directory contains its file, so every project can receive a database with
+only its own entries plus the entries of some chosen dependencies.
+"""
+import os
+import re
+from urllib.parse import quote
+
+from .database import DatabaseWriter, iter_entries
+
+
+class ProjectPartitioner:
+    """
+    Find the project of a path from a dictionary {directory prefix: project}.
+    When several prefixes match, the longest one wins.
+    """
+
+    def __init__(self, prefixes):
+        self.prefixes = prefixes
+        ordered = sorted(prefixes, key=len, reverse=True)
+        self.regex = re.compile('|'.join(re.escape(prefix) for prefix in ordered)) if ordered else None
+
+    def owner(self, path):
+        if self.regex is None:
+            return None
+        match = self.regex.match(path)
+        return self.prefixes[match.group(0)] if match else None
+
+
+def write_project_databases(database_path, partitioner, projects, deps, output_dir):
+    """
+    Split a compile command database in one database per project.
+    Entries of the projects in deps are added to all the databases. Entries without project are discarded.
+    :returns: dictionary {project: database path}, without the projects which have no entries.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    output_paths = {
+            project: os.path.join(output_dir, quote(project, safe='') + '.json')
+            for project in projects
+            }
+    writers = {project: DatabaseWriter(output_path) for project, output_path in output_paths.items()}
+
+    try:
+        for entry in iter_entries(database_path):
+            # A relative file can go up from its directory, e.g. ../../src/foo/a.cpp from the build directory.
+            file_path = os.path.normpath(os.path.join(entry.get('directory', ''), entry.get('file', '')))
+            project = partitioner.owner(file_path)
+            if project in deps:
+                for writer in writers.values():
+                    writer.write(entry)
+            elif project in writers:
+                writers[project].write(entry)
+    except BaseException:
+        for writer in writers.values():
+            writer.abort()
+        raise
+
+    for project, writer in writers.items():
+        if writer.num_entries:
+            writer.close()
+        else:
+            writer.abort()
+            del output_paths[project]
+
+    return output_paths
@@ -0,0 +1,116 @@
+# Copyright 2020 Ricardo González
+# Licensed under the Apache License, Version 2.0
+
+"""
+Path rewriting of compile command databases.
+All the path mappings are compiled in one regular expression, so each field is scanned only once whatever the
+number of mappings.
+"""
+import hashlib
+import json
+import mmap
+import os
+import re
+
+PATH_FIELDS = ('directory', 'file', 'output', 'command')
+WRITE_BUFFER_SIZE = 1024 * 1024
+SENDFILE_THRESHOLD = 64 * 1024
+
+
+class PathRewriter:
+    """
+    Rewrite paths using a list of (origin, destination) prefix mappings.
+    When several origins match at the same position, the longest one wins.
+    """
+
+    def __init__(self, mappings):
+        self.mappings = {}
+        for origin, dest in mappings:
+            self.mappings.setdefault(origin, dest)
+        origins = sorted(self.mappings, key=len, reverse=True)
+        self.regex = re.compile('|'.join(re.escape(origin) for origin in origins)) if origins else None
+        self.bytes_regex = None
+        self.bytes_mappings = None
+
+    def fingerprint(self):
+        """
+        Identify the set of mappings, to know whether an already rewritten fragment is still valid.
+        """
+        return hashlib.sha1(json.dumps(sorted(self.mappings.items())).encode('utf-8')).hexdigest()
+
+    def _replace(self, match):
+        return self.mappings[match.group(0)]
+
+    def rewrite(self, text):
+        if self.regex is None:
+            return text
+        return self.regex.sub(self._replace, text)
+
+    def compile_bytes(self):
+        """
+        Compile the mappings to work on JSON encoded bytes, as written by DatabaseWriter.
+        """
+        if self.bytes_mappings is None:
+            self.bytes_mappings = {
+                    json.dumps(origin)[1:-1].encode('utf-8'): json.dumps(dest)[1:-1].encode('utf-8')
+                    for origin, dest in self.mappings.items()
+                    }
+            origins = sorted(self.bytes_mappings, key=len, reverse=True)
+            self.bytes_regex = re.compile(b'|'.join(re.escape(origin) for origin in origins)) if origins else None
+        return self.bytes_regex, self.bytes_mappings
+
+    def rewrite_entry(self, entry):
+        for field in PATH_FIELDS:
+            if field in entry:
+                entry[field] = self.rewrite(entry[field])
+        if 'arguments' in entry:
+            entry['arguments'] = [self.rewrite(argument) for argument in entry['arguments']]
+        return entry
+
+
+def rewrite_file_mmap(rewriter, input_path, output_path):
+    """
+    Rewrite the paths of a file scanning it memory-mapped, without decoding it.
+    Unlike PathRewriter.rewrite_entry(), every occurrence is rewritten, whatever the field it is in. Spans between
+    matches are copied with os.sendfile() when big enough, and with buffered writes when not.
+    :returns: number of rewritten paths
+    """
+    regex, mappings = rewriter.compile_bytes()
+    tmp_path = '{}.tmp{}'.format(output_path, os.getpid())
+    num_matches = 0
+
+    with open(input_path, 'rb') as source, open(tmp_path, 'wb', buffering=0) as output:
+        size = os.fstat(source.fileno()).st_size
+        buffer = bytearray()
+
+        def flush():
+            with memoryview(buffer) as view:
+                written = 0
+                while written < len(view):
+                    written += output.write(view[written:])
+            del buffer[:]
+
+        def copy_span(data, start, end):
+            if end - start >= SENDFILE_THRESHOLD:
+                flush()
+                while start < end:
+                    start += os.sendfile(output.fileno(), source.fileno(), start, end - start)
+            else:
+                buffer.extend(data[start:end])
+                if len(buffer) >= WRITE_BUFFER_SIZE:
+                    flush()
+
+        if size > 0:
+            with mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                pos = 0
+                if regex is not None:
+                    for match in regex.finditer(data):
+                        copy_span(data, pos, match.start())
+                        buffer.extend(mappings[match.group(0)])
+                        pos = match.end()
+                        num_matches += 1
+                copy_span(data, pos, size)
+        flush()
+
+    os.replace(tmp_path, output_path)
+    return num_matches
@@ -0,0 +1,183 @@
+# Copyright 2020 Ricardo González
+# Licensed under the Apache License, Version 2.0
+
+"""
+Watch the per-package compile command databases and call back when they change.
+It uses inotify through ctypes and falls back to polling when inotify is not available.
+Changes are debounced, so a colcon build writing lots of databases triggers only one callback.
+"""
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+
+from .database import DATABASE_NAME
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_ATTRIB
+
+_event_header = struct.Struct('iIII')
+
+
+class Inotify:
+    def __init__(self):
+        libc_name = ctypes.util.find_library('c')
+        self.libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self.watches = {}
+
+    def add_watch(self, path, mask=WATCH_MASK):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), path)
+        self.watches[wd] = path
+        return wd
+
+    def read_events(self, timeout):
+        """
+        :returns: list of tuples (directory, name, mask); empty if the timeout expires.
+        """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        pos = 0
+        while pos < len(data):
+            wd, mask, cookie, length = _event_header.unpack_from(data, pos)
+            pos += _event_header.size
+            name = data[pos:pos + length].rstrip(b'\0').decode('utf-8', 'surrogateescape')
+            pos += length
+            if mask & IN_IGNORED:
+                self.watches.pop(wd, None)
+                continue
+            events.append((self.watches.get(wd), name, mask))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class Watcher:
+    """
+    Watch the compile_commands.json files under build_dir and some extra files (e.g. the HEAD of the worktrees).
+    """
+
+    def __init__(self, build_dir, extra_files=(), debounce=1.0, poll_interval=2.0, use_polling=False):
+        self.build_dir = build_dir
+        self.extra_files = {os.path.abspath(path) for path in extra_files}
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.inotify = None
+        if not use_polling:
+            try:
+                self.inotify = Inotify()
+            except (OSError, AttributeError):
+                self.inotify = None
+
+    def is_relevant(self, directory, name):
+        if name == DATABASE_NAME:
+            return True
+        return directory is not None and os.path.join(directory, name) in self.extra_files
+
+    def add_tree(self, path):
+        for root, dirs, files in os.walk(path):
+            dirs[:] = [d for d in dirs if not d.startswith('.')]
+            try:
+                self.inotify.add_watch(root)
+            except OSError:
+                pass
+
+    def setup_inotify(self):
+        self.add_tree(self.build_dir)
+        for directory in {os.path.dirname(path) for path in self.extra_files}:
+            try:
+                self.inotify.add_watch(directory)
+            except OSError:
+                pass
+
+    def wait_inotify(self):
+        changed = False
+        timeout = None
+        while True:
+            events = self.inotify.read_events(timeout)
+            if not events:
+                if changed:
+                    return
+                continue
+            for directory, name, mask in events:
+                if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO) and directory is not None:
+                    # New package directories created by colcon.
+                    new_dir = os.path.join(directory, name)
+                    self.add_tree(new_dir)
+                    changed = changed or any(DATABASE_NAME in files for _, _, files in os.walk(new_dir))
+                elif self.is_relevant(directory, name):
+                    changed = True
+            if changed:
+                timeout = self.debounce
+
+    def snapshot(self):
+        stamps = {}
+        for root, dirs, files in os.walk(self.build_dir):
+            dirs[:] = [d for d in dirs if not d.startswith('.')]
+            if DATABASE_NAME in files:
+                path = os.path.join(root, DATABASE_NAME)
+                try:
+                    stat = os.stat(path)
+                    stamps[path] = (stat.st_mtime_ns, stat.st_size)
+                except OSError:
+                    pass
+        for path in self.extra_files:
+            try:
+                stamps[path] = os.stat(path).st_mtime_ns
+            except OSError:
+                stamps[path] = None
+        return stamps
+
+    def wait_polling(self, previous):
+        changed = False
+        while True:
+            time.sleep(self.debounce if changed else self.poll_interval)
+            current = self.snapshot()
+            if current != previous:
+                changed = True
+                previous = current
+            elif changed:
+                return current
+
+    def run(self, callback):
+        """
+        Call callback every time the watched files change, until interrupted.
+        """
+        if self.inotify:
+            self.setup_inotify()
+            while True:
+                self.wait_inotify()
+                callback()
+        else:
+            stamps = self.snapshot()
+            while True:
+                stamps = self.wait_polling(stamps)
+                callback()
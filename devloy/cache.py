@@ -0,0 +1,157 @@
+# Copyright 2019 Ricardo González
+# Licensed under the Apache License, Version 2.0
+
+import fcntl
+import json
+import os
+import threading
+from pathlib import Path
+
+from . import git, timing
+
+
+def cache_dir(application='devloy'):
+    """
+    :returns: The directory where the application stores its caches.
+    """
+    xdg_cache_home = os.environ.get('XDG_CACHE_HOME')
+    base_dir = Path(xdg_cache_home) if xdg_cache_home else Path.home() / '.cache'
+    return base_dir / application
+
+
+class FileCache:
+    """
+    Dictionary persisted as a JSON file.
+    Writes are atomic and serialized with a lock file. On saving, entries stored by other processes meanwhile are kept.
+    Entries can be stored from several threads.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.lock_path = self.path.with_name(self.path.name + '.lock')
+        self.data = self.read()
+        self.modified = set()
+        self.removed = set()
+        self.lock = threading.Lock()
+
+    def read(self):
+        timing.count('files read')
+        try:
+            with open(self.path, 'r', encoding='utf-8') as cache_file:
+                return json.load(cache_file)
+        except (OSError, ValueError):
+            return {}
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def __setitem__(self, key, value):
+        with self.lock:
+            self.data[key] = value
+            self.modified.add(key)
+            self.removed.discard(key)
+
+    def __delitem__(self, key):
+        with self.lock:
+            del self.data[key]
+            self.removed.add(key)
+            self.modified.discard(key)
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def save(self):
+        with self.lock:
+            self._save()
+
+    def _save(self):
+        if not self.modified and not self.removed:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.lock_path, 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            data = self.read()
+            for key in self.removed:
+                data.pop(key, None)
+            for key in self.modified:
+                data[key] = self.data[key]
+            tmp_path = self.path.with_name('{}.tmp{}'.format(self.path.name, os.getpid()))
+            with open(tmp_path, 'w', encoding='utf-8') as cache_file:
+                json.dump(data, cache_file)
+            os.replace(tmp_path, self.path)
+        self.data = data
+        self.modified.clear()
+        self.removed.clear()
+
+    def close(self):
+        self.save()
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+class ProjectCache:
+    """
+    Metadata of projects (colcon.pkg and repos contents, Git remote and branch), keyed by project directory.
+    The entry of a project is invalidated when the mtime of its colcon.pkg, repos files, .git, or the HEAD or config of
+    its Git directories changes.
+    """
+
+    def __init__(self, path=None):
+        self.file_cache = FileCache(path if path else cache_dir() / 'projects.json')
+
+    def stamp(self, project_dir, stamps=None):
+        """
+        :param stamps: Dictionary of the stamps already taken by the caller, so each project is checked only once.
+        """
+        project_dir = str(project_dir)
+        stamp = stamps.get(project_dir) if stamps is not None else None
+        if stamp is None:
+            stamp = {}
+            try:
+                with os.scandir(project_dir) as entries:
+                    for entry in entries:
+                        if entry.name == 'colcon.pkg' or entry.name.endswith('.repos'):
+                            stamp[entry.name] = entry.stat().st_mtime_ns
+            except OSError:
+                pass
+            git_path = os.path.join(project_dir, '.git')
+            stamp['.git'] = _mtime(git_path)
+            # In linked worktrees .git is a file, HEAD is in the worktree Git directory and config in the common one.
+            try:
+                git_dir, common_dir = git.resolve_git_dirs(git_path)
+            except (OSError, ValueError):
+                git_dir = common_dir = git_path
+            stamp['.git/HEAD'] = _mtime(os.path.join(git_dir, 'HEAD'))
+            stamp['.git/config'] = _mtime(os.path.join(common_dir, 'config'))
+            if stamps is not None:
+                stamps[project_dir] = stamp
+        return stamp
+
+    def get(self, project_dir, key, stamps=None):
+        """
+        :returns: tuple (found, value)
+        """
+        entry = self.file_cache.get(str(project_dir))
+        if entry is None or entry['stamp'] != self.stamp(project_dir, stamps) or key not in entry['values']:
+            return False, None
+        return True, entry['values'][key]
+
+    def set(self, project_dir, key, value, stamps=None):
+        project_dir = str(project_dir)
+        entry = self.file_cache.get(project_dir)
+        stamp = self.stamp(project_dir, stamps)
+        values = dict(entry['values']) if entry is not None and entry['stamp'] == stamp else {}
+        values[key] = value
+        # A new entry is stored instead of changing the one other threads may be reading.
+        self.file_cache[project_dir] = {'stamp': stamp, 'values': values}
+
+    def save(self):
+        self.file_cache.save()
@@ -2,32 +2,78 @@
 # Licensed under the Apache License, Version 2.0
 
 import argparse
+import importlib
 import logging
+import sys
 
-from . import start, stop
-from .defaults import Defaults
+from . import timing
 
 logger = None
 
+# Verbs: name -> (module defining add_subparser(), help). Only the module of the verb being run is imported.
+VERBS = {
+    'start': ('devloy.start', 'start help'),
+    'stop': ('devloy.stop', 'stop help'),
+    'index': ('devloy.index', 'Rebuild the index of the repositories in the search paths.'),
+    'graph': ('devloy.graph', 'Export the dependency graph of the projects.'),
+    'pool': ('devloy.pool', 'Prepare development containers ahead of devloy start.'),
+}
+
+
+def find_verb(global_parser, args):
+    """
+    :returns: The verb given in the arguments, or None. Once the global options and their values are parsed, it is
+        the first positional argument.
+    """
+    _, remaining = global_parser.parse_known_args(args)
+    for arg in remaining:
+        if not arg.startswith('-'):
+            return arg if arg in VERBS else None
+    return None
+
 
 def arg_parser(args):
     global logger
 
-    # Before execute verb, load default values from configuration.
-    defaults = Defaults()
-
-    parser = argparse.ArgumentParser(
-            prog='devloy',
-            description='Command to deploy dockerized development environments.')
-    parser.add_argument(
+    # Global options, also parsed on their own to find the verb before adding its subparser.
+    global_parser = argparse.ArgumentParser(add_help=False)
+    global_parser.add_argument(
             '--debug',
             action='store_true',
             help='Print debug info.'
     )
+    global_parser.add_argument(
+            '--no-cache',
+            action='store_true',
+            help='Do not use the cache of projects metadata, the index of the search paths nor the cached defaults.'
+    )
+    global_parser.add_argument(
+            '--docker-cli',
+            action='store_true',
+            help='Use the docker command instead of the Docker Engine API socket.'
+    )
+    global_parser.add_argument(
+            '--profile',
+            action='store_true',
+            help='Time the phases of the command and print a summary to stderr.'
+    )
+    global_parser.add_argument(
+            '--profile-output',
+            metavar='TRACE_FILE',
+            help='With --profile, write a Chrome trace-event JSON file instead of the summary.'
+    )
 
+    parser = argparse.ArgumentParser(
+            prog='devloy',
+            description='Command to deploy dockerized development environments.',
+            parents=[global_parser])
     subparsers = parser.add_subparsers(help='verbs help')
-    start.add_subparser(subparsers, defaults)
-    stop.add_subparser(subparsers)
+    verb_name = find_verb(global_parser, sys.argv[1:] if args is None else args)
+    for name, (module_name, help_text) in VERBS.items():
+        if name == verb_name:
+            importlib.import_module(module_name).add_subparser(subparsers)
+        else:
+            subparsers.add_parser(name, help=help_text)
 
     verb = parser.parse_args(args)
     # Set log level
@@ -35,8 +81,23 @@ def arg_parser(args):
         logger.setLevel(logging.DEBUG)
     else:
         logger.setLevel(logging.INFO)
+    if verb.profile or verb.profile_output:
+        timing.enable(verb.profile_output or timing.SUMMARY)
+
+    from . import docker
+    from .defaults import Defaults
+
+    docker.configure(use_cli=verb.docker_cli)
+    # Default values from configuration are only loaded to execute a verb.
+    with timing.span('defaults'):
+        defaults = Defaults(use_cache=not verb.no_cache)
 
-    verb.func(verb, defaults, logger)
+    with timing.span('verb'):
+        try:
+            return verb.func(verb, defaults, logger)
+        except docker.DockerError as error:
+            logger.error('Cannot query docker, is the daemon running? {}'.format(error))
+            return 1
 
 
 def main(argv=None):
@@ -62,4 +123,6 @@ def main(argv=None):
     # - Add handlers to the logger
     logger.addHandler(c_handler)
 
-    arg_parser(argv)
+    return_code = arg_parser(argv)
+    timing.report()
+    return return_code
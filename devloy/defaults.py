@@ -2,46 +2,49 @@
 # Licensed under the Apache License, Version 2.0
 
 import getpass
+import marshal
+import os
 from pathlib import Path
 
-import yaml
+from . import timing
+from .cache import cache_dir
+
+SNAPSHOT_VERSION = 1
 
 
 class DockerDefaults:
-    build_dir = None
-    build_tmp_dir = None
-    cap_add = []
-    groups = []
-    env = []
-    image = None
-    install_dir = None
-    install_tmp_dir = None
-    net = None
-    privileged = None
-    security_opt = None
-    user_env = False
-    volumes = []
-    shm_size = None
-    extra_args = []
+    def __init__(self):
+        self.build_dir = None
+        self.build_tmp_dir = None
+        self.cap_add = []
+        self.groups = []
+        self.env = []
+        self.image = None
+        self.install_dir = None
+        self.install_tmp_dir = None
+        self.net = None
+        self.privileged = None
+        self.security_opt = None
+        self.user_env = False
+        self.volumes = []
+        self.shm_size = None
+        self.extra_args = []
 
 
 class Defaults:
-    docker = DockerDefaults()
-    search_paths = []
-    username = ''
-
     def get_user_name(self):
         self.username = getpass.getuser()
 
-    def __init__(self):
+    def __init__(self, use_cache=True):
+        self.docker = DockerDefaults()
+        self.search_paths = []
         self.get_user_name()
 
         defaults_path = Path.home() / '.config/devloy/defaults.yaml'
         if not defaults_path.is_file():
             return
 
-        defaults_content = defaults_path.read_text()
-        yaml_content = yaml.safe_load(defaults_content)
+        yaml_content = read_defaults_file(defaults_path, use_cache)
         if 'search-paths' in yaml_content:
             self.search_paths = yaml_content['search-paths']
         if 'docker' in yaml_content:
@@ -80,3 +83,41 @@ class Defaults:
                     self.docker.shm_size = docker_run_config['shm-size']
                 if 'extra-args' in docker_run_config:
                     self.docker.extra_args = docker_run_config['extra-args']
+
+
+def read_defaults_file(defaults_path, use_cache=True):
+    """
+    Parse the defaults file. Its content is kept in a marshal snapshot, reused while the mtime and size of the file
+    don't change, so PyYAML is neither imported nor run in most executions.
+    """
+    stat = defaults_path.stat()
+    stamp = (str(defaults_path), stat.st_mtime_ns, stat.st_size)
+    snapshot_path = cache_dir() / 'defaults.marshal'
+
+    if use_cache:
+        try:
+            with open(snapshot_path, 'rb') as snapshot_file:
+                version, snapshot_stamp, content = marshal.load(snapshot_file)
+            if SNAPSHOT_VERSION == version and stamp == snapshot_stamp:
+                return content
+        except (OSError, EOFError, ValueError, TypeError):
+            pass
+
+    import yaml
+
+    timing.count('files read')
+    content = yaml.safe_load(defaults_path.read_text())
+
+    if use_cache:
+        tmp_path = snapshot_path.with_name('{}.tmp{}'.format(snapshot_path.name, os.getpid()))
+        try:
+            snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, 'wb') as snapshot_file:
+                marshal.dump((SNAPSHOT_VERSION, stamp, content), snapshot_file)
+            os.replace(tmp_path, snapshot_path)
+        except (OSError, ValueError):
+            # Values not supported by marshal (e.g. dates) are not cached.
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+    return content
@@ -0,0 +1,254 @@
+# Copyright 2019 Ricardo González
+# Licensed under the Apache License, Version 2.0
+
+"""
+Lightweight client of the Docker Engine API.
+It talks HTTP over the docker unix socket and keeps the connection open between calls. When the socket cannot be
+used, or if asked to, it falls back to the docker command.
+"""
+import http.client
+import json
+import os
+import re
+import socket
+import subprocess
+from urllib.parse import quote, urlencode
+
+from . import timing
+
+DEFAULT_SOCKET_PATH = '/var/run/docker.sock'
+DEV_CONTAINER_PREFIX = 'dev_'
+# Pooled containers are development containers too, so they are in the snapshot taken by devloy start.
+POOL_PREFIX = DEV_CONTAINER_PREFIX + '_pool_'
+
+
+class DockerError(Exception):
+    pass
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path, timeout=60):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+def default_socket_path():
+    docker_host = os.environ.get('DOCKER_HOST', '')
+    if docker_host.startswith('unix://'):
+        return docker_host[len('unix://'):]
+    if docker_host:
+        return None
+    return DEFAULT_SOCKET_PATH
+
+
+class DockerClient:
+    def __init__(self, socket_path=None, use_cli=False):
+        self.socket_path = socket_path if socket_path else default_socket_path()
+        self.use_cli = use_cli or self.socket_path is None
+        self.connection = None
+
+    def close(self):
+        if self.connection:
+            self.connection.close()
+            self.connection = None
+
+    def request(self, method, path, query=None):
+        """
+        Send a request to the Docker Engine API.
+        :returns: status code, decoded JSON body (or None if empty)
+        """
+        if query:
+            path = '{}?{}'.format(path, urlencode(query))
+
+        timing.count('docker requests')
+        with timing.span('docker api {}'.format(method)):
+            for attempt in range(2):
+                if self.connection is None:
+                    self.connection = UnixHTTPConnection(self.socket_path)
+                try:
+                    self.connection.request(method, path, headers={'Host': 'docker'})
+                    response = self.connection.getresponse()
+                    body = response.read()
+                    break
+                except (http.client.HTTPException, BrokenPipeError, ConnectionResetError):
+                    # The daemon closed the kept-alive connection, retry once with a new one.
+                    self.close()
+                    if attempt:
+                        raise
+
+        if response.will_close:
+            self.close()
+        return response.status, json.loads(body) if body else None
+
+    def api(self, method, path, query=None):
+        """
+        Call the API if the socket is usable.
+        :returns: status code and decoded body, or None if the docker command has to be used instead.
+        """
+        if self.use_cli:
+            return None
+        try:
+            return self.request(method, path, query)
+        except (FileNotFoundError, ConnectionRefusedError, PermissionError):
+            self.close()
+            self.use_cli = True
+            return None
+
+    def run_cli(self, *args):
+        timing.count('subprocesses')
+        try:
+            with timing.span('docker {}'.format(args[0])):
+                docker_proc = subprocess.run(['docker'] + list(args), stdout=subprocess.PIPE,
+                                             stderr=subprocess.DEVNULL)
+        except FileNotFoundError:
+            raise DockerError('docker command not found')
+        return docker_proc.returncode, docker_proc.stdout
+
+    def list_containers(self, all=False, filters=None):
+        """
+        :returns: list of containers as returned by GET /containers/json.
+        """
+        query = {'all': '1' if all else '0'}
+        if filters:
+            query['filters'] = json.dumps(filters)
+        response = self.api('GET', '/containers/json', query)
+        if response is not None:
+            status, containers = response
+            if 200 != status:
+                raise DockerError('Listing containers: {}'.format(containers))
+            return containers
+
+        args = ['ps', '-q', '--no-trunc']
+        if all:
+            args.append('--all')
+        for key, values in (filters or {}).items():
+            for value in values:
+                args += ['-f', '{}={}'.format(key, value)]
+        returncode, output = self.run_cli(*args)
+        if 0 != returncode:
+            raise DockerError('docker ps failed')
+        ids = output.decode('utf-8').split()
+        if not ids:
+            return []
+        returncode, output = self.run_cli('inspect', '--type', 'container', *ids)
+        # A container removed after docker ps makes docker inspect fail, but the others are still printed.
+        try:
+            infos = json.loads(output)
+        except ValueError:
+            raise DockerError('docker inspect failed')
+        return [{
+            'Id': info['Id'],
+            'Names': [info['Name']],
+            'Image': info['Config']['Image'],
+            'State': info['State']['Status'],
+            'Mounts': info['Mounts'],
+            } for info in infos]
+
+    def inspect_container(self, name):
+        """
+        :returns: container information as returned by GET /containers/{name}/json, or None if it doesn't exist.
+        """
+        response = self.api('GET', '/containers/{}/json'.format(quote(name, safe='')))
+        if response is not None:
+            status, info = response
+            return info if 200 == status else None
+
+        returncode, output = self.run_cli('inspect', '--type', 'container', name)
+        return json.loads(output)[0] if 0 == returncode else None
+
+    def stop_container(self, name):
+        response = self.api('POST', '/containers/{}/stop'.format(quote(name, safe='')))
+        if response is not None:
+            return response[0] in (204, 304)
+        return 0 == self.run_cli('stop', name)[0]
+
+    def remove_container(self, name):
+        response = self.api('DELETE', '/containers/{}'.format(quote(name, safe='')))
+        if response is not None:
+            return 204 == response[0]
+        return 0 == self.run_cli('rm', name)[0]
+
+    def create_container(self, args):
+        """
+        Create a container with the arguments of docker run. The command is always used, as translating the
+        arguments into an API request is not worth it.
+        """
+        return 0 == self.run_cli('create', *args)[0]
+
+    def start_container(self, name):
+        response = self.api('POST', '/containers/{}/start'.format(quote(name, safe='')))
+        if response is not None:
+            return response[0] in (204, 304)
+        return 0 == self.run_cli('start', name)[0]
+
+    def rename_container(self, name, new_name):
+        response = self.api('POST', '/containers/{}/rename'.format(quote(name, safe='')), {'name': new_name})
+        if response is not None:
+            return 204 == response[0]
+        return 0 == self.run_cli('rename', name, new_name)[0]
+
+
+class ContainerSnapshot:
+    """
+    State of the development containers, taken with only one query to docker.
+    Containers are looked up by their exact name.
+    """
+
+    def __init__(self, containers):
+        self.containers = {}
+        for container in containers:
+            for name in container['Names']:
+                self.containers[name.lstrip('/')] = container
+
+    @classmethod
+    def take(cls, prefix=DEV_CONTAINER_PREFIX, client=None):
+        """
+        List once all the containers, running or not, whose name starts with prefix.
+        """
+        client = client if client else get_client()
+        containers = client.list_containers(all=True, filters={'name': ['^/' + re.escape(prefix)]})
+        return cls(container for container in containers
+                   if any(name.lstrip('/').startswith(prefix) for name in container['Names']))
+
+    def names(self):
+        return sorted(self.containers)
+
+    def get(self, name):
+        return self.containers.get(name)
+
+    def exists(self, name):
+        return name in self.containers
+
+    def state(self, name):
+        container = self.containers.get(name)
+        return container['State'] if container else None
+
+    def is_running(self, name):
+        return 'running' == self.state(name)
+
+    def mounts(self, name):
+        container = self.containers.get(name)
+        return container['Mounts'] if container else []
+
+
+_client = None
+
+
+def get_client():
+    """
+    :returns: The client shared by all devloy commands, so the connection is reused.
+    """
+    global _client
+    if _client is None:
+        _client = DockerClient()
+    return _client
+
+
+def configure(use_cli=False):
+    if use_cli:
+        get_client().use_cli = True
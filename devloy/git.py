@@ -0,0 +1,162 @@
+# Copyright 2019 Ricardo González
+# Licensed under the Apache License, Version 2.0
+
+"""
+Read Git metadata directly from the .git files, without launching the git command.
+The git command is only used as fallback for layouts not understood here (e.g. included config files).
+"""
+import os
+import re
+import subprocess
+
+from . import timing
+
+_section_regex = re.compile(r'^\s*\[\s*([^\s\]"]+)(?:\s+"((?:[^"\\]|\\.)*)")?\s*\]')
+_key_value_regex = re.compile(r'^\s*([A-Za-z][A-Za-z0-9-]*)\s*(?:=\s*(.*?))?\s*$')
+
+
+def _read_first_line(path):
+    timing.count('files read')
+    with open(path, 'r', encoding='utf-8') as file:
+        return file.readline().strip()
+
+
+def find_dot_git(path):
+    """
+    Find the .git directory or file of the repository containing path.
+    :returns: The path of .git or None.
+    """
+    path = os.path.abspath(path)
+    while True:
+        dot_git = os.path.join(path, '.git')
+        if os.path.exists(dot_git):
+            return dot_git
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
+
+
+def resolve_git_dirs(dot_git):
+    """
+    Resolve the Git directory of a .git directory or a .git file (worktrees and submodules).
+    :returns: tuple (git dir, common dir)
+    """
+    if os.path.isfile(dot_git):
+        content = _read_first_line(dot_git)
+        if not content.startswith('gitdir:'):
+            raise ValueError('{}: unknown .git file'.format(dot_git))
+        git_dir = content[len('gitdir:'):].strip()
+        git_dir = os.path.normpath(os.path.join(os.path.dirname(dot_git), git_dir))
+    else:
+        git_dir = dot_git
+
+    common_dir = git_dir
+    commondir_path = os.path.join(git_dir, 'commondir')
+    if os.path.isfile(commondir_path):
+        common_dir = os.path.normpath(os.path.join(git_dir, _read_first_line(commondir_path)))
+
+    return git_dir, common_dir
+
+
+def _run_git(project_dir, *args):
+    timing.count('subprocesses')
+    with timing.span('git {}'.format(args[0])):
+        git_proc = subprocess.run(
+                ['git'] + list(args),
+                cwd=project_dir,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL)
+    if 0 != git_proc.returncode:
+        return None
+    return git_proc.stdout.decode('utf-8').rstrip()
+
+
+def current_branch(project_dir):
+    """
+    Get the current branch, like `git branch --show-current`.
+    :returns: The name of the branch, an empty string if HEAD is detached or None if it is not a Git repository.
+    """
+    dot_git = find_dot_git(project_dir)
+    if dot_git is None:
+        return None
+
+    try:
+        git_dir, common_dir = resolve_git_dirs(dot_git)
+        head = _read_first_line(os.path.join(git_dir, 'HEAD'))
+    except (OSError, ValueError):
+        return _run_git(project_dir, 'branch', '--show-current')
+
+    if head.startswith('ref:'):
+        ref = head[len('ref:'):].strip()
+        return ref[len('refs/heads/'):] if ref.startswith('refs/heads/') else ref
+    return ''
+
+
+def read_config(config_path):
+    """
+    Parse a Git config file.
+    :returns: dictionary {(section, subsection): {key: [values]}} or None if it uses unsupported features.
+    """
+    config = {}
+    values = None
+
+    timing.count('files read')
+    with open(config_path, 'r', encoding='utf-8') as config_file:
+        for line in config_file:
+            line = line.strip()
+            if not line or line[0] in '#;':
+                continue
+            if line[0] == '[':
+                match = _section_regex.match(line)
+                if not match:
+                    return None
+                section = match.group(1).lower()
+                subsection = match.group(2)
+                if section in ('include', 'includeif') or (subsection is None and '.' in section):
+                    return None
+                values = config.setdefault((section, subsection), {})
+                if match.end() < len(line):
+                    line = line[match.end():].strip()
+                    if not line or line[0] in '#;':
+                        continue
+                else:
+                    continue
+            if values is None or line.endswith('\\'):
+                return None
+            match = _key_value_regex.match(line)
+            if not match:
+                return None
+            value = match.group(2)
+            if value is not None and value.startswith('"') and value.endswith('"') and 1 < len(value):
+                value = value[1:-1]
+            if value is not None and any(char in value for char in '"\\#;'):
+                return None
+            values.setdefault(match.group(1).lower(), []).append(value)
+
+    return config
+
+
+def remote_url(project_dir, remote='origin'):
+    """
+    Get the url of a remote, like `git remote get-url origin`.
+    :returns: The url or None if not found.
+    """
+    dot_git = find_dot_git(project_dir)
+    if dot_git is None:
+        return None
+
+    try:
+        git_dir, common_dir = resolve_git_dirs(dot_git)
+        config = read_config(os.path.join(common_dir, 'config'))
+    except (OSError, ValueError):
+        config = None
+
+    # Rewritten urls are resolved by git itself.
+    if config is None or any(section == 'url' for section, subsection in config):
+        return _run_git(project_dir, 'remote', 'get-url', remote)
+
+    urls = config.get(('remote', remote), {}).get('url')
+    if not urls or urls[0] is None:
+        return None
+    return urls[0]
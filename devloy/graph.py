@@ -0,0 +1,223 @@
+# Copyright 2019 Ricardo González
+# Licensed under the Apache License, Version 2.0
+
+"""
+Dependency graph of the projects resolved by ProjectsInfo.
+Nodes are projects (main, extra repositories, dependencies, or missing ones when their directory is not found) and
+edges are dependencies declared in colcon.pkg or only in the repos file.
+"""
+import json
+
+MAIN = 'main'
+EXTRA = 'extra'
+DEPENDENCY = 'dependency'
+MISSING = 'missing'
+
+COLCON = 'colcon'
+REPOS = 'repos'
+
+
+class ProjectNode:
+    __slots__ = ('name', 'directory', 'suffix', 'kind')
+
+    def __init__(self, name, directory, suffix, kind):
+        self.name = name
+        self.directory = directory
+        self.suffix = suffix
+        self.kind = kind
+
+    def as_dict(self):
+        return {
+            'name': self.name,
+            'directory': str(self.directory) if self.directory else None,
+            'suffix': self.suffix,
+            'kind': self.kind
+            }
+
+
+class DependencyGraph:
+    def __init__(self):
+        self.nodes = {}
+        self.edges = {}
+
+    def __contains__(self, name):
+        return name in self.nodes
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def add_node(self, name, directory, suffix, kind):
+        """
+        Add a project. A missing project is replaced if it is found later.
+        """
+        node = self.nodes.get(name)
+        if node is None or (MISSING == node.kind and MISSING != kind):
+            self.nodes[name] = ProjectNode(name, directory, suffix, kind)
+            self.edges.setdefault(name, {})
+        return self.nodes[name]
+
+    def add_edge(self, source, target, kind):
+        # A colcon dependency is stronger than a repos one.
+        if self.edges[source].get(target) != COLCON:
+            self.edges[source][target] = kind
+
+    def dependencies(self, name):
+        return list(self.edges.get(name, {}))
+
+    def find_cycles(self):
+        """
+        Find the groups of projects depending on each other (strongly connected components, Tarjan's algorithm).
+        :returns: list of cycles, each one a sorted list of project names.
+        """
+        cycles = []
+        indexes = {}
+        low_links = {}
+        component = []
+        in_component = set()
+        for root in self.nodes:
+            if root in indexes:
+                continue
+            indexes[root] = low_links[root] = len(indexes)
+            component.append(root)
+            in_component.add(root)
+            stack = [(root, iter(self.edges.get(root, {})))]
+            while stack:
+                name, targets = stack[-1]
+                target = next(targets, None)
+                if target is not None:
+                    if target not in indexes:
+                        indexes[target] = low_links[target] = len(indexes)
+                        component.append(target)
+                        in_component.add(target)
+                        stack.append((target, iter(self.edges.get(target, {}))))
+                    elif target in in_component:
+                        low_links[name] = min(low_links[name], indexes[target])
+                    continue
+
+                stack.pop()
+                if stack:
+                    parent = stack[-1][0]
+                    low_links[parent] = min(low_links[parent], low_links[name])
+                if low_links[name] == indexes[name]:
+                    members = []
+                    while True:
+                        member = component.pop()
+                        in_component.discard(member)
+                        members.append(member)
+                        if member == name:
+                            break
+                    if 1 < len(members) or name in self.edges.get(name, {}):
+                        cycles.append(sorted(members))
+        return cycles
+
+    def topological_order(self):
+        """
+        :returns: list of project names, each one after its dependencies. Edges closing a cycle are ignored.
+        """
+        order = []
+        state = {}
+        for root in self.nodes:
+            if root in state:
+                continue
+            state[root] = 1
+            path = [root]
+            stack = [iter(self.edges[root])]
+            while stack:
+                target = next(stack[-1], None)
+                if target is None:
+                    name = path.pop()
+                    state[name] = 2
+                    order.append(name)
+                    stack.pop()
+                elif target not in state:
+                    state[target] = 1
+                    path.append(target)
+                    stack.append(iter(self.edges.get(target, {})))
+        return order
+
+    def to_json(self):
+        return json.dumps({
+            'nodes': [node.as_dict() for node in self.nodes.values()],
+            'edges': [{'source': source, 'target': target, 'kind': kind}
+                      for source, targets in self.edges.items() for target, kind in targets.items()],
+            'order': self.topological_order(),
+            'cycles': self.find_cycles()
+            }, indent=2)
+
+    def to_dot(self):
+        lines = ['digraph devloy {', '  node [shape=box];']
+        for node in self.nodes.values():
+            attributes = ['label={}'.format(json.dumps(
+                '{}\n{}'.format(node.name, node.directory) if node.directory else node.name))]
+            if MAIN == node.kind:
+                attributes.append('style=bold')
+            elif EXTRA == node.kind:
+                attributes.append('style=rounded')
+            elif MISSING == node.kind:
+                attributes.append('style=dashed color=red')
+            lines.append('  {} [{}];'.format(json.dumps(node.name), ' '.join(attributes)))
+        for source, targets in self.edges.items():
+            for target, kind in targets.items():
+                lines.append('  {} -> {}{};'.format(
+                    json.dumps(source), json.dumps(target), ' [style=dashed]' if REPOS == kind else ''))
+        lines.append('}')
+        return '\n'.join(lines)
+
+
+def add_subparser(subparser):
+    graph_parser = subparser.add_parser('graph', help='Export the dependency graph of the projects.')
+    graph_parser.add_argument(
+            '-D',
+            '--all-deps',
+            action='store_true',
+            help='Use all the dependencies of the repos files, like start does.'
+    )
+    graph_parser.add_argument(
+            '-r',
+            '--repo',
+            nargs='*',
+            default=[],
+            help='List of extra repositories to be included. Format: (repo[:branch])'
+    )
+    graph_parser.add_argument(
+            '-f',
+            '--format',
+            choices=('dot', 'json'),
+            default='dot',
+            help='Output format (default: %(default)s).'
+    )
+    graph_parser.add_argument(
+            '-o',
+            '--output',
+            help='Write the graph to this file instead of stdout.'
+    )
+    graph_parser.set_defaults(func=graph_verb_init)
+
+
+def graph_verb_init(args, defaults, logger):
+    """
+    Starting point of the graph command
+    """
+    # Imported here, as projects_info depends on this module.
+    from .cache import ProjectCache
+    from .index import SearchPathsIndex
+    from .projects_info import ProjectsInfo
+
+    projects_info = ProjectsInfo(
+            logger, args.all_deps, args.repo, defaults.search_paths,
+            cache=None if args.no_cache else ProjectCache(),
+            index=None if args.no_cache else SearchPathsIndex(defaults.search_paths))
+    projects_info.get_main_project_info()
+    projects_info.get_projects_info()
+    projects_info.save_cache()
+
+    graph = projects_info.graph
+    for cycle in graph.find_cycles():
+        logger.warning('Dependency cycle between: {}'.format(', '.join(cycle)))
+
+    content = graph.to_dot() if 'dot' == args.format else graph.to_json()
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output:
+            output.write(content + '\n')
+    else:
+        print(content)
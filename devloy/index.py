@@ -0,0 +1,196 @@
+# Copyright 2019 Ricardo González
+# Licensed under the Apache License, Version 2.0
+
+"""
+Index of the repositories found in the search paths: repository name -> worktree directories and their branches.
+Each search path is listed in one pass with os.scandir, so finding a dependency is a dictionary lookup instead of
+several stats. A search path is scanned again when its mtime changes (a repository was added or removed), and a
+repository when its mtime changes (a worktree was added or removed).
+"""
+import os
+import threading
+from pathlib import Path
+
+from . import git
+from .cache import FileCache, cache_dir
+
+MAIN_WORKTREE = 'master'
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def scan_repository(repo_path):
+    """
+    :returns: dictionary {'stamp': mtime, 'worktrees': {worktree directory: branch}}. The branch is None for
+        directories which are not Git worktrees.
+    """
+    worktrees = {}
+    stamp = _mtime(repo_path)
+    try:
+        with os.scandir(repo_path) as entries:
+            for entry in entries:
+                if entry.name.startswith('.') or not entry.is_dir():
+                    continue
+                branch = None
+                if os.path.exists(os.path.join(entry.path, '.git')):
+                    branch = git.current_branch(entry.path)
+                worktrees[entry.name] = branch
+    except OSError:
+        pass
+    return {'stamp': stamp, 'worktrees': worktrees}
+
+
+def scan_search_path(search_path):
+    """
+    :returns: dictionary {repository: scanned repository}
+    """
+    repositories = {}
+    try:
+        with os.scandir(search_path) as entries:
+            for entry in entries:
+                if not entry.name.startswith('.') and entry.is_dir():
+                    repositories[entry.name] = scan_repository(entry.path)
+    except OSError:
+        pass
+    return repositories
+
+
+class SearchPathsIndex:
+    def __init__(self, search_paths, path=None):
+        self.search_paths = [str(search_path) for search_path in search_paths]
+        self.file_cache = FileCache(path if path else cache_dir() / 'search-paths.json')
+        self.lock = threading.Lock()
+
+    def scan(self, search_path):
+        # The git metadata is read without the lock, only the result is swapped in under it.
+        entry = {'stamp': _mtime(search_path), 'repositories': scan_search_path(search_path)}
+        with self.lock:
+            self.file_cache[search_path] = entry
+        return entry
+
+    def refresh(self):
+        """
+        Scan again all the search paths.
+        """
+        for search_path in self.search_paths:
+            self.scan(search_path)
+
+    def repositories(self, search_path, checked=None):
+        """
+        :param checked: Set of what the caller already checked, so each search path and repository is checked only
+            once. Without it, everything is checked again.
+        :returns: The indexed repositories of a search path, scanning it if it changed since it was indexed.
+        """
+        checked = checked if checked is not None else set()
+        entry = self.file_cache.get(search_path)
+        if ('search path', search_path) not in checked:
+            if entry is None or entry['stamp'] != _mtime(search_path):
+                entry = self.scan(search_path)
+            checked.add(('search path', search_path))
+        return entry['repositories']
+
+    def store_repository(self, search_path, repository, scanned):
+        # A new entry is stored instead of changing the one other threads may be reading.
+        with self.lock:
+            entry = self.file_cache[search_path]
+            repositories = dict(entry['repositories'])
+            repositories[repository] = scanned
+            self.file_cache[search_path] = {'stamp': entry['stamp'], 'repositories': repositories}
+
+    def worktrees(self, search_path, repository, checked=None):
+        """
+        :returns: The worktrees of a repository, or None if it is not in the search path. The repository is scanned
+            again if it changed since it was indexed (e.g. a worktree was added or removed).
+        """
+        checked = checked if checked is not None else set()
+        scanned = self.repositories(search_path, checked).get(repository)
+        if scanned is None:
+            return None
+
+        repo_path = os.path.join(search_path, repository)
+        if ('repository', repo_path) not in checked:
+            if scanned['stamp'] != _mtime(repo_path):
+                scanned = scan_repository(repo_path)
+                self.store_repository(search_path, repository, scanned)
+            checked.add(('repository', repo_path))
+        return scanned['worktrees']
+
+    def branches(self, search_path, repository, checked=None):
+        """
+        :returns: The worktrees of a repository with their current branches. Checking out another branch doesn't
+            change the mtime of the repository, so the branches are read again once per resolution.
+        """
+        checked = checked if checked is not None else set()
+        scanned = self.repositories(search_path, checked)[repository]
+        repo_path = os.path.join(search_path, repository)
+        if ('branches', repo_path) not in checked:
+            worktrees = {directory: git.current_branch(os.path.join(repo_path, directory)) if branch is not None
+                         else None for directory, branch in scanned['worktrees'].items()}
+            if worktrees != scanned['worktrees']:
+                scanned = {'stamp': scanned['stamp'], 'worktrees': worktrees}
+                self.store_repository(search_path, repository, scanned)
+            checked.add(('branches', repo_path))
+        return scanned['worktrees']
+
+    def find(self, repository, worktree, checked=None):
+        """
+        Find the directory of a repository like ProjectsInfo.find_dep_dir. A worktree can be given by its directory
+        name or by its branch.
+        :param checked: See repositories.
+        :return: repository directory, suffix
+        """
+        checked = checked if checked is not None else set()
+        wanted = worktree if worktree else MAIN_WORKTREE
+        for search_path in self.search_paths:
+            worktrees = self.worktrees(search_path, repository, checked)
+            if worktrees is None:
+                continue
+            repo_path = Path(search_path) / repository
+            # Only the top level directories are indexed, a nested one (e.g. feature/x) is checked on disk.
+            if wanted in worktrees or (worktree and os.path.isdir(repo_path / wanted)):
+                return repo_path / wanted, wanted
+            if worktree:
+                for directory, branch in sorted(self.branches(search_path, repository, checked).items()):
+                    if branch == worktree:
+                        return repo_path / directory, directory
+            return repo_path, None
+
+        return None, None
+
+    def save(self):
+        self.file_cache.save()
+
+
+def add_subparser(subparser):
+    index_parser = subparser.add_parser('index', help='Rebuild the index of the repositories in the search paths.')
+    index_parser.add_argument(
+            '-l',
+            '--list',
+            action='store_true',
+            help='Print the indexed repositories, their worktrees and branches.'
+    )
+    index_parser.set_defaults(func=index_verb_init)
+
+
+def index_verb_init(args, defaults, logger):
+    """
+    Starting point of the index command
+    """
+    index = SearchPathsIndex(defaults.search_paths)
+    index.refresh()
+    index.save()
+
+    for search_path in index.search_paths:
+        repositories = index.repositories(search_path)
+        logger.info('{}: {} repositories'.format(search_path, len(repositories)))
+        if args.list:
+            for repository in sorted(repositories):
+                worktrees = repositories[repository]['worktrees']
+                print('{}\t{}'.format(repository, ' '.join(
+                    '{}({})'.format(directory, branch) if branch else directory
+                    for directory, branch in sorted(worktrees.items()))))
@@ -0,0 +1,112 @@
+# Copyright 2019 Ricardo González
+# Licensed under the Apache License, Version 2.0
+
+"""
+Lockfile with the resolved closure of the main project: the projects info, their docker mounts and the
+CCDB_WORKTREE_APPLICATION string. It is written next to the main project and reused while the options and the
+input files of the resolution (colcon.pkg and repos files of every project) are the same, and the directories where
+the dependencies were searched (search_path/repository) were not added, removed or changed (e.g. a new worktree).
+"""
+import hashlib
+import json
+import os
+
+from . import timing
+
+LOCKFILE_NAME = '.devloy.lock'
+LOCKFILE_VERSION = 2
+
+
+def input_files(project_dirs):
+    """
+    :returns: sorted list of the files the projects info was derived from.
+    """
+    files = []
+    for project_dir in project_dirs:
+        try:
+            with os.scandir(project_dir) as entries:
+                for entry in entries:
+                    if entry.name == 'colcon.pkg' or entry.name.endswith('.repos'):
+                        files.append(entry.path)
+        except OSError:
+            # The project directory is hashed anyway, so its disappearance changes the digest.
+            files.append(project_dir)
+    return sorted(files)
+
+
+def searched_directories(search_paths, repositories):
+    """
+    :returns: sorted list of the directories where the repositories are looked up, found or not.
+    """
+    return sorted(os.path.join(str(search_path), repository)
+                  for search_path in search_paths for repository in repositories)
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def inputs_digest(key, project_dirs, searched=()):
+    digest = hashlib.sha1(json.dumps(key, sort_keys=True).encode('utf-8'))
+    for path in searched:
+        digest.update('{}\0{}\0'.format(path, _mtime(path)).encode('utf-8'))
+    for path in input_files(project_dirs):
+        digest.update(path.encode('utf-8') + b'\0')
+        try:
+            with open(path, 'rb') as input_file:
+                digest.update(input_file.read())
+        except OSError:
+            digest.update(b'\0missing')
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class Lockfile:
+    def __init__(self, path=LOCKFILE_NAME):
+        self.path = path
+
+    @timing.timed('lockfile load')
+    def load(self, key):
+        """
+        :returns: The locked closure (dictionary with projects_info, mounts and ccdb), or None if there is no
+            lockfile or it is outdated.
+        """
+        try:
+            with open(self.path, 'r', encoding='utf-8') as lock_file:
+                content = json.load(lock_file)
+        except (OSError, ValueError):
+            return None
+
+        if content.get('version') != LOCKFILE_VERSION or content.get('key') != key:
+            return None
+        projects_info = content['projects_info']
+        digest = inputs_digest(key, [info[0] for info in projects_info.values()], content['searched'])
+        if content['digest'] != digest:
+            return None
+        return content
+
+    def save(self, key, projects_info, mounts, ccdb, searched=()):
+        """
+        :param searched: directories where the dependencies were looked up, see searched_directories().
+        """
+        content = {
+            'version': LOCKFILE_VERSION,
+            'key': key,
+            'digest': inputs_digest(key, [info[0] for info in projects_info.values()], searched),
+            'searched': list(searched),
+            'projects_info': projects_info,
+            'mounts': mounts,
+            'ccdb': ccdb
+            }
+        tmp_path = '{}.tmp{}'.format(self.path, os.getpid())
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as lock_file:
+                json.dump(content, lock_file, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            # The lockfile is only an optimization, e.g. the project directory could be read-only.
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
@@ -0,0 +1,167 @@
+# Copyright 2019 Ricardo González
+# Licensed under the Apache License, Version 2.0
+
+"""
+Pool of development containers prepared ahead of time, e.g. from a git post-checkout hook, so devloy start claims an
+already created and initialized container instead of running a new one.
+Docker cannot add mounts to an existing container, so a pooled container is created with all the arguments devloy
+start would use for a worktree. Its name is a digest of those arguments, and devloy start claims it by renaming it
+when the digest of its own arguments matches.
+"""
+import hashlib
+import json
+import os
+import stat
+
+from . import timing
+from .docker import POOL_PREFIX, ContainerSnapshot, get_client
+
+HOOK_MARKER = '# Installed by devloy pool hook'
+HOOK = '''#!/bin/sh
+{}
+# Prepare in background the development container of the checked out branch.
+[ "$3" = 1 ] || exit 0
+devloy pool prepare >/dev/null 2>&1 &
+'''.format(HOOK_MARKER)
+
+
+def container_arguments(docker_args):
+    """
+    :returns: The arguments of docker run without the command, the verb and the container name.
+    """
+    args = list(docker_args[2:])
+    if '--name' in args:
+        position = args.index('--name')
+        del args[position:position + 2]
+    return args
+
+
+def pooled_container_name(docker_args):
+    digest = hashlib.sha1(json.dumps(container_arguments(docker_args)).encode('utf-8'))
+    return POOL_PREFIX + digest.hexdigest()[:16]
+
+
+def prepare_container(docker_args, logger, client=None):
+    """
+    Create and start the pooled container for docker_args, if it is not already prepared.
+    :returns: The name of the pooled container, or None if it could not be prepared.
+    """
+    client = client if client else get_client()
+    name = pooled_container_name(docker_args)
+    snapshot = ContainerSnapshot.take(name, client)
+    if not snapshot.exists(name):
+        if not client.create_container(['--name', name] + container_arguments(docker_args)):
+            logger.error('Cannot create the pooled container {}'.format(name))
+            return None
+        timing.count('pooled containers created')
+    # Starting it runs the initialization of the image now instead of on devloy start.
+    if not snapshot.is_running(name) and not client.start_container(name):
+        logger.error('Cannot start the pooled container {}'.format(name))
+        return None
+    return name
+
+
+def claim_container(docker_args, container_name, snapshot=None, client=None):
+    """
+    Rename the pooled container prepared for docker_args to container_name.
+    :param snapshot: ContainerSnapshot including the pooled containers.
+    :returns: The state of the claimed container, or None if there isn't a pooled container for docker_args.
+    """
+    client = client if client else get_client()
+    snapshot = snapshot if snapshot else ContainerSnapshot.take(POOL_PREFIX, client)
+    name = pooled_container_name(docker_args)
+    state = snapshot.state(name)
+    # Renaming fails if another devloy start claimed it first.
+    if state is None or not client.rename_container(name, container_name):
+        return None
+    timing.count('pooled containers claimed')
+    return state
+
+
+def install_hook(force=False):
+    """
+    Install the post-checkout hook in the repository of the current directory. Hooks are shared by all the worktrees.
+    :returns: Path of the hook, or None if there is another hook and force is not set.
+    """
+    from . import git
+
+    dot_git = git.find_dot_git('.')
+    if dot_git is None:
+        raise ValueError('Not inside a Git repository')
+    git_dir, common_dir = git.resolve_git_dirs(dot_git)
+    hook_path = os.path.join(common_dir, 'hooks', 'post-checkout')
+    if os.path.exists(hook_path) and not force:
+        with open(hook_path, 'r', encoding='utf-8') as hook_file:
+            if HOOK_MARKER not in hook_file.read():
+                return None
+
+    os.makedirs(os.path.dirname(hook_path), exist_ok=True)
+    with open(hook_path, 'w', encoding='utf-8') as hook_file:
+        hook_file.write(HOOK)
+    os.chmod(hook_path, os.stat(hook_path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    return hook_path
+
+
+def add_subparser(subparser):
+    # Imported here, as start depends on this module.
+    from .start import add_start_arguments
+
+    pool_parser = subparser.add_parser('pool', help='Prepare development containers ahead of devloy start.')
+    actions = pool_parser.add_subparsers(dest='action', required=True, help='pool actions')
+    prepare_parser = actions.add_parser(
+            'prepare',
+            help='Create and start the container of the current worktree, to be claimed by devloy start.')
+    add_start_arguments(prepare_parser)
+    actions.add_parser('list', help='List the pooled containers.')
+    actions.add_parser('clear', help='Remove the pooled containers.')
+    hook_parser = actions.add_parser(
+            'hook',
+            help='Install a git post-checkout hook running devloy pool prepare in background.')
+    hook_parser.add_argument(
+            '-f',
+            '--force',
+            action='store_true',
+            help='Replace an existing post-checkout hook.'
+    )
+    pool_parser.set_defaults(func=pool_verb_init)
+
+
+def pool_verb_init(args, defaults, logger):
+    """
+    Starting point of the pool command
+    """
+    if 'prepare' == args.action:
+        from .start import resolve_mounts, resolve_start
+
+        command, projects_info, key = resolve_start(args, defaults, logger)
+        if command.exists_docker_container():
+            logger.info('Development environment {} is already created'.format(command.container_name))
+            projects_info.save_cache()
+            return
+        info, mounts = resolve_mounts(args, logger, projects_info, key)
+        projects_info.save_cache()
+        name = prepare_container(command.prepare_call(info, mounts), logger)
+        if name:
+            logger.info('Prepared {} for {}'.format(name, command.container_name))
+    elif 'list' == args.action:
+        snapshot = ContainerSnapshot.take(POOL_PREFIX)
+        for name in snapshot.names():
+            print('{}\t{}\t{}'.format(name, snapshot.state(name), snapshot.get(name)['Image']))
+    elif 'clear' == args.action:
+        client = get_client()
+        snapshot = ContainerSnapshot.take(POOL_PREFIX, client)
+        for name in snapshot.names():
+            if snapshot.is_running(name):
+                client.stop_container(name)
+            if client.remove_container(name):
+                logger.debug('Removed {}'.format(name))
+    elif 'hook' == args.action:
+        try:
+            hook_path = install_hook(args.force)
+        except ValueError as error:
+            logger.error(error)
+            return
+        if hook_path:
+            logger.info('Installed {}'.format(hook_path))
+        else:
+            logger.error('There is already a post-checkout hook, use --force to replace it')
@@ -1,22 +1,39 @@
 # Copyright 2019 Ricardo González
 # Licensed under the Apache License, Version 2.0
 
-import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-import yaml
+from . import git, timing
 
 
 class ProjectsInfo:
-    projects_dir = [(None, '.', None)]  # (project name, project dir)
-    projects_info = {}
-    all_deps = False
-    search_paths = []
-
-    def __init__(self, logger, all_deps, extra_repos, search_paths):
+    """
+    Resolution of the projects of a workspace. All the state belongs to the instance, so several workspaces can be
+    resolved in the same process, even concurrently. The cache and the index can be shared between instances.
+    """
+
+    def __init__(self, logger, all_deps, extra_repos, search_paths, max_workers=None, cache=None, index=None,
+                 main_dir='.'):
+        self.main_dir = main_dir
+        self.projects_dir = [(None, main_dir, None)]  # (project name, project dir, suffix)
+        self.projects_info = {}
         self.logger = logger
         self.all_deps = all_deps
         self.search_paths = search_paths
+        self.max_workers = max_workers
+        self.cache = cache
+        self.index = index
+        # What the cache and the index checked for this resolution, each file is checked once. It is kept here, as
+        # the cache and the index can be shared with resolutions running meanwhile.
+        self.stamps = {}
+        self.checked = set()
+        self.dep_dirs = {}
+        self._graph = None
+        # Names of the projects already registered or waiting in projects_dir.
+        self.queued = set()
+        self.extra_repos = set()
+        self.main_project = None
 
         for repo in extra_repos:
             repo_info = repo.split(':')
@@ -28,36 +45,80 @@ class ProjectsInfo:
             if repo_dir:
                 self.logger.debug('    Adding extra repo {} - {}'.format(repo_name, repo_dir))
                 self.projects_dir.append((repo_name, repo_dir, branch))
+                self.queued.add(repo_name)
+                self.extra_repos.add(repo_name)
+
+    @property
+    def graph(self):
+        """
+        DependencyGraph of the registered projects. The graph module is only loaded once projects are registered, not
+        when devloy start only needs the main project.
+        """
+        if self._graph is None:
+            from .graph import DependencyGraph
+            self._graph = DependencyGraph()
+        return self._graph
+
+    def cached(self, project_dir, key, compute):
+        """
+        Get a metadata value of a project from the cache, computing and storing it if not found.
+        """
+        if self.cache is None:
+            return compute()
+
+        found, value = self.cache.get(project_dir, key, self.stamps)
+        if not found:
+            value = compute()
+            self.cache.set(project_dir, key, value, self.stamps)
+        return value
+
+    def save_cache(self):
+        if self.cache is not None:
+            self.cache.save()
+        if self.index is not None:
+            self.index.save()
 
     def read_colcon_pkg(self, colcon_pkg_path):
         """
         Read the content of a colcon.pkg file.
         :returns: package name , list of project dependencies
         """
-        colcon_pkg_content = colcon_pkg_path.read_text()
-        yaml_content = yaml.safe_load(colcon_pkg_content)
+        def parse_colcon_pkg():
+            import yaml
+
+            timing.count('files read')
+            colcon_pkg_content = colcon_pkg_path.read_text()
+            yaml_content = yaml.safe_load(colcon_pkg_content)
+
+            if 'name' not in yaml_content:
+                return None, None
+
+            return yaml_content['name'], yaml_content['dependencies'] if 'dependencies' in yaml_content else None
 
-        if 'name' not in yaml_content:
-            return None, None
+        name, dependencies = self.cached(colcon_pkg_path.parent, 'colcon.pkg', parse_colcon_pkg)
+        return name, dependencies
 
-        return yaml_content['name'], yaml_content['dependencies'] if 'dependencies' in yaml_content else None
+    def get_remote_url(self, project_dir):
+        """
+        :returns: The url of the origin remote of the Git repository.
+        """
+        return self.cached(project_dir, 'remote-url', lambda: git.remote_url(project_dir))
+
+    def get_current_branch(self, project_dir):
+        """
+        :returns: The current branch of the Git repository, or an empty string.
+        """
+        return self.cached(project_dir, 'branch', lambda: git.current_branch(project_dir) or '')
 
     def get_repo_name(self, project_dir):
         """
         Get the project name from the Git repository url.
         :returns: The name of the Git repository.
         """
-        git_remote_proc = subprocess.Popen(
-                'cd {} && git remote get-url origin'.format(project_dir),
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                shell=True)
-        git_remote_proc.wait()
-        if 0 != git_remote_proc.returncode:
+        url = self.get_remote_url(project_dir)
+        if url is None:
             return None
 
-        url = git_remote_proc.stdout.readline().decode('utf-8').rstrip()
-
         try:
             url = url[:url.rindex('.git')]
         except ValueError:
@@ -74,6 +135,15 @@ class ProjectsInfo:
         """
         :return: repository directory, suffix
         """
+        key = (repository, worktree)
+        if key not in self.dep_dirs:
+            self.dep_dirs[key] = self.lookup_dep_dir(repository, worktree)
+        return self.dep_dirs[key]
+
+    def lookup_dep_dir(self, repository, worktree):
+        if self.index is not None:
+            return self.index.find(repository, worktree, self.checked)
+
         for search_path in self.search_paths:
             repo_path = Path(search_path) / repository
             if worktree:
@@ -87,21 +157,14 @@ class ProjectsInfo:
             if repo_path.is_dir():
                 return repo_path, None
 
-            return None, None
+        return None, None
 
     def get_project_suffix(self, project_name, project_dir):
         """
         Get the project branch and verify that it is used in a worktree environment.
         :returns: The suffix used in the project's directory
         """
-        suffix = ''
-        git_branch_proc = subprocess.Popen(
-                'cd {} && git branch --show-current'.format(project_dir),
-                stdout=subprocess.PIPE,
-                shell=True)
-        git_branch_proc.wait()
-        if 0 == git_branch_proc.returncode:
-            suffix = git_branch_proc.stdout.readline().decode('utf-8').rstrip()
+        suffix = self.get_current_branch(project_dir)
 
         directory_suffix = ''
         try:
@@ -116,19 +179,18 @@ class ProjectsInfo:
 
         return suffix if suffix else None
 
-    def process_project_deps(self, project_name, project_dir, project_dir_name, colcon_deps):
+    def read_repos_file(self, project_name, project_dir, project_dir_name):
         """
-        Get dependencies information, and store them to be processed.
+        Find repos file to get info about dependencies.
+            - {project_name}.repos
+            - lowercase<{project_name}>.repos
+            - {project_dir_name}.repos
+        :returns: The repositories listed in the repos file or None if not found.
         """
-        self.logger.debug('  Processing dependencies of {}'.format(project_name))
-        num_colcon_deps = len(colcon_deps) if colcon_deps else 0
-        dependencies = colcon_deps if colcon_deps else []
-        initial_pos_projects_dir = len(self.projects_dir)
+        return self.cached(project_dir, 'repos:{}:{}'.format(project_name, project_dir_name),
+                           lambda: self.parse_repos_file(project_name, project_dir, project_dir_name))
 
-        # Find repos file to get info about dependencies.
-        # - {project_name}.repos
-        # - lowercase<{project_name}>.repos
-        # - {project_dir_name}.repos
+    def parse_repos_file(self, project_name, project_dir, project_dir_name):
         found_file = False
 
         repos_path = project_dir / (project_name + '.repos')
@@ -143,10 +205,44 @@ class ProjectsInfo:
             if repos_path.is_file():
                 found_file = True
 
-        if found_file:
-            repos_content = repos_path.read_text()
-            yaml_content = yaml.safe_load(repos_content)
-            repositories = yaml_content['repositories']
+        if not found_file:
+            return None
+
+        import yaml
+
+        timing.count('files read')
+        repos_content = repos_path.read_text()
+        yaml_content = yaml.safe_load(repos_content)
+        return yaml_content['repositories']
+
+    def queue_dependency(self, project_name, dependency, worktree, kind):
+        """
+        Add the dependency to the graph, and to projects_dir if it wasn't seen before.
+        """
+        from .graph import MISSING
+
+        repo_dir, suffix = self.find_dep_dir(dependency, worktree)
+        if repo_dir:
+            if dependency not in self.queued and dependency not in self.projects_info:
+                self.queued.add(dependency)
+                self.projects_dir.append((dependency, repo_dir, suffix))
+        else:
+            self.graph.add_node(dependency, None, worktree, MISSING)
+        self.graph.add_edge(project_name, dependency, kind)
+
+    def process_project_deps(self, project_name, colcon_deps, repositories):
+        """
+        Get dependencies information, and store them to be processed.
+        """
+        from .graph import COLCON, REPOS
+
+        self.logger.debug('  Processing dependencies of {}'.format(project_name))
+        num_colcon_deps = len(colcon_deps) if colcon_deps else 0
+        dependencies = list(colcon_deps) if colcon_deps else []
+        initial_pos_projects_dir = len(self.projects_dir)
+
+        if repositories is not None:
+            repositories = dict(repositories)
 
             while 0 < len(dependencies):
                 dependency = dependencies.pop(0)
@@ -158,11 +254,7 @@ class ProjectsInfo:
                         worktree = repository['version']
                 except Exception:
                     pass
-                repo_dir, suffix = self.find_dep_dir(dependency, worktree)
-                if (repo_dir and
-                        self.projects_info.get(dependency) is None and
-                        not any(dependency in i for i in self.projects_dir)):
-                    self.projects_dir.append((dependency, repo_dir, suffix))
+                self.queue_dependency(project_name, dependency, worktree, COLCON)
 
             if 0 == num_colcon_deps or self.all_deps:
                 for name in repositories:
@@ -171,11 +263,7 @@ class ProjectsInfo:
                         worktree = None
                         if 'version' in repository:
                             worktree = repository['version']
-                        repo_dir, suffix = self.find_dep_dir(name, worktree)
-                        if (repo_dir and
-                                self.projects_info.get(name) is None and
-                                not any(name in i for i in self.projects_dir)):
-                            self.projects_dir.append((name, repo_dir, suffix))
+                        self.queue_dependency(project_name, name, worktree, REPOS)
 
             self.logger.debug('    Dependencies:')
             while initial_pos_projects_dir < len(self.projects_dir):
@@ -229,17 +317,19 @@ class ProjectsInfo:
             self.logger.error('Cannot get project name for directory {}'.format(project_dir))
             return get_project_dir.name, get_project_dir, None, None
 
-        # If processing directory '.', try to find its suffix (branch).
-        if not suffix and project_dir == '.':
+        # If processing the main directory, try to find its suffix (branch).
+        if not suffix and project_dir == self.main_dir:
             suffix = self.get_project_suffix(get_project_name, str(get_project_dir))
 
         return get_project_name, get_project_dir, suffix, colcon_project_deps
 
-    def process_project_info(self, project_name, project_dir, suffix):
+    @timing.timed('resolve project')
+    def resolve_project_info(self, project_name, project_dir, suffix):
         """
-        Call to get project info, store it and its dependencies to be processed too.
+        Read all the information of a project which doesn't depend on the rest of projects: its colcon.pkg, its Git
+        repository, its repos file and the directories of its dependencies. It can be called concurrently.
 
-        :returns:
+        :returns: project name, project directory, suffix, colcon dependencies, project directory name, repositories
         """
         assert(project_dir is not None)
         self.logger.debug('  Processing directory {}'.format(project_dir))
@@ -251,33 +341,83 @@ class ProjectsInfo:
         if None != suffix:
             project_dir_name = project_dir_name.replace('/' + suffix, '')
 
+        repositories = None
+        if get_project_name:
+            repositories = self.read_repos_file(get_project_name, get_project_dir, project_dir_name)
+        if repositories is not None:
+            # Warm up the lookup of dependencies directories.
+            for name in set(colcon_project_deps or []) | set(repositories):
+                repository = repositories.get(name)
+                worktree = repository.get('version') if isinstance(repository, dict) else None
+                self.find_dep_dir(name, worktree)
+
+        return get_project_name, get_project_dir, suffix, colcon_project_deps, project_dir_name, repositories
+
+    def register_project_info(self, resolved_info):
+        """
+        Store the project info and its dependencies to be processed too.
+        """
+        from .graph import DEPENDENCY, EXTRA, MAIN
+
+        get_project_name, get_project_dir, suffix, colcon_project_deps, project_dir_name, repositories = resolved_info
+
         if get_project_name:
             self.projects_info[get_project_name] = (
                     str(get_project_dir),
                     project_dir_name
                     )
+            if get_project_name == self.main_project or (self.main_project is None and not self.graph.nodes):
+                kind = MAIN
+            elif get_project_name in self.extra_repos:
+                kind = EXTRA
+            else:
+                kind = DEPENDENCY
+            self.graph.add_node(get_project_name, get_project_dir, suffix, kind)
             self.logger.debug('    Registered ({}: {}, {})'.format(get_project_name, str(get_project_dir), suffix))
-            self.process_project_deps(get_project_name, get_project_dir, project_dir_name, colcon_project_deps)
+            self.process_project_deps(get_project_name, colcon_project_deps, repositories)
 
-        return
+    def process_project_info(self, project_name, project_dir, suffix):
+        """
+        Call to get project info, store it and its dependencies to be processed too.
+
+        :returns:
+        """
+        self.register_project_info(self.resolve_project_info(project_name, project_dir, suffix))
 
+    @timing.timed('projects info')
     def get_projects_info(self):
+        """
+        Process the known directories level by level. The projects of a level are resolved concurrently, and then
+        registered in order, so the result is the same as processing them one by one.
+        """
         self.logger.debug('Getting projects information...')
 
-        # For each known directory. Projects directories could be increased getting infor about projects.
-        while 0 < len(self.projects_dir):
-            project_search_info = self.projects_dir.pop(0)
-            self.process_project_info(project_search_info[0], project_search_info[1], project_search_info[2])
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            # For each known directory. Projects directories could be increased getting infor about projects.
+            while 0 < len(self.projects_dir):
+                in_flight = {}
+                level = list(self.projects_dir)
+                for project_search_info in level:
+                    if project_search_info not in in_flight:
+                        in_flight[project_search_info] = executor.submit(
+                                self.resolve_project_info, *project_search_info)
+
+                for project_search_info in level:
+                    self.projects_dir.pop(0)
+                    self.register_project_info(in_flight[project_search_info].result())
 
         return self.projects_info
 
+    @timing.timed('main project info')
     def get_main_project_info(self):
-        if 0 < len(self.projects_dir) and self.projects_dir[0][1] == '.':
+        if 0 < len(self.projects_dir) and self.projects_dir[0][1] == self.main_dir:
             project_info = self.projects_dir.pop(0)
             get_project_name, get_project_dir, suffix, deps = self.get_project_info(
                     project_info[0], project_info[1], project_info[2])
             if get_project_name:
                 self.projects_dir.append((get_project_name, str(get_project_dir), suffix))
+                self.queued.add(get_project_name)
+                self.main_project = get_project_name
             return get_project_name, suffix
 
         return None, None
@@ -4,13 +4,19 @@
 import os
 from pathlib import Path
 
+from . import timing
+from .cache import ProjectCache
+from .docker import DEV_CONTAINER_PREFIX, POOL_PREFIX
+from .index import SearchPathsIndex
 from .projects_info import ProjectsInfo
 from .utils import (
     deduce_image,
     docker_container_name,
     exists_docker_container,
     is_running_docker_container,
+    take_containers_snapshot,
 )
+from .workspace import project_mounts
 
 
 class StartCommand:
@@ -18,7 +24,7 @@ class StartCommand:
     image = None
     defaults = None
     logger = None
-    projects_info = {}
+    snapshot = None
     use_tmp = False
     use_x11 = False
 
@@ -31,13 +37,23 @@ class StartCommand:
         self.use_x11 = use_x11
         self.logger.debug("Starting development environment {}".format(container_name))
 
+    def containers_snapshot(self):
+        if self.snapshot is None:
+            self.snapshot = take_containers_snapshot(self.container_name)
+        return self.snapshot
+
     def exists_docker_container(self):
-        return exists_docker_container(self.container_name)
+        return exists_docker_container(self.container_name, self.containers_snapshot())
 
     def is_running_docker_container(self):
-        return is_running_docker_container(self.container_name)
+        return is_running_docker_container(self.container_name, self.containers_snapshot())
 
-    def prepare_call(self, projects_info):
+    @timing.timed('prepare call')
+    def prepare_call(self, projects_info, mounts=None):
+        """
+        :param mounts: mounts of the projects and CCDB_WORKTREE_APPLICATION entries, as returned by
+            project_mounts(). Calculated from projects_info if not given.
+        """
         docker_args = ["docker", "run", "-ti", "--name", self.container_name]
         for cap_add in self.defaults.docker.cap_add:
             docker_args.append("--cap-add={}".format(cap_add))
@@ -91,14 +107,11 @@ class StartCommand:
                 docker_args.append("-e")
                 docker_args.append(f"DISPLAY={os.environ['DISPLAY']}")
 
-        ccdb_env_string = ""
-
         # Project directories
-        for project in projects_info:
-            info = projects_info.get(project)
+        volumes, ccdb_env_string = mounts if mounts else project_mounts(projects_info)
+        for volume in volumes:
             docker_args.append("-v")
-            docker_args.append("{}:{}".format(info[0], info[1]))
-            ccdb_env_string += "{}:{},".format(info[0], info[1])
+            docker_args.append(volume)
 
         # Building directories
         if self.use_tmp:
@@ -119,6 +132,7 @@ class StartCommand:
                 )
                 if not build_dir.exists():
                     build_dir.mkdir(parents=True)
+                    timing.count("directories created")
                 build_dir_symlink = Path("./build")
                 if not build_dir_symlink.exists():
                     os.symlink(build_dir, build_dir_symlink)
@@ -139,6 +153,7 @@ class StartCommand:
                 )
                 if not install_dir.exists():
                     install_dir.mkdir(parents=True)
+                    timing.count("directories created")
                 install_dir_symlink = Path("./install")
                 if not install_dir_symlink.exists():
                     os.symlink(install_dir, install_dir_symlink)
@@ -160,6 +175,7 @@ class StartCommand:
                 )
                 if not build_dir.exists():
                     build_dir.mkdir(parents=True)
+                    timing.count("directories created")
                 build_dir_symlink = Path("./build")
                 if not build_dir_symlink.exists():
                     os.symlink(build_dir, build_dir_symlink)
@@ -180,6 +196,7 @@ class StartCommand:
                 )
                 if not install_dir.exists():
                     install_dir.mkdir(parents=True)
+                    timing.count("directories created")
                 install_dir_symlink = Path("./install")
                 if not install_dir_symlink.exists():
                     os.symlink(install_dir, install_dir_symlink)
@@ -195,22 +212,55 @@ class StartCommand:
 
         return docker_args
 
-    def start_docker_container(self, projects_info):
-        docker_args = self.prepare_call(projects_info)
+    def start_docker_container(self, projects_info, mounts=None, use_pool=True):
+        docker_args = self.prepare_call(projects_info, mounts)
+        if use_pool and self.claim_pooled_container(docker_args):
+            return
         print(docker_args)
-        os.execvp("docker", docker_args)
+        exec_docker(docker_args)
+
+    def claim_pooled_container(self, docker_args):
+        """
+        Use the container prepared by devloy pool prepare with the same arguments, if there is one.
+
+        :returns: True if a pooled container was claimed.
+        """
+        # The pooled containers are only in the snapshot if it was taken for the development containers.
+        snapshot = None
+        if self.container_name.startswith(DEV_CONTAINER_PREFIX):
+            snapshot = self.containers_snapshot()
+            if not any(name.startswith(POOL_PREFIX) for name in snapshot.names()):
+                return False
+
+        from .pool import claim_container, pooled_container_name
+
+        state = claim_container(docker_args, self.container_name, snapshot)
+        if state is None:
+            return False
+        self.logger.debug("Using pooled container {}".format(pooled_container_name(docker_args)))
+        if "running" == state:
+            exec_docker(["docker", "exec", "-ti", self.container_name, "/bin/bash"])
+        else:
+            exec_docker(["docker", "start", "-i", self.container_name])
+        return True
 
     def exec_docker_container(self):
         if not self.is_running_docker_container():
-            os.execvp("docker", ["docker", "start", "-i", self.container_name])
+            exec_docker(["docker", "start", "-i", self.container_name])
         else:
-            os.execvp(
-                "docker", ["docker", "exec", "-ti", self.container_name, "/bin/bash"]
-            )
+            exec_docker(["docker", "exec", "-ti", self.container_name, "/bin/bash"])
 
 
-def add_subparser(subparser, defaults):
-    start_parser = subparser.add_parser("start", help="start help")
+def exec_docker(docker_args):
+    # The process is replaced, so the profile has to be reported now.
+    timing.report()
+    os.execvp("docker", docker_args)
+
+
+def add_start_arguments(start_parser):
+    """
+    Add the arguments deciding the development container, shared with devloy pool prepare.
+    """
     start_parser.add_argument(
         "-D",
         "--all-deps",
@@ -240,33 +290,46 @@ def add_subparser(subparser, defaults):
     start_parser.add_argument(
         "-c", "--container", nargs=1, help="Docker container name to be used."
     )
+    start_parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="Resolve the dependencies again instead of using the .devloy.lock lockfile.",
+    )
     start_parser.add_argument(
         "-i",
         "--image",
         nargs=1,
-        default=[defaults.docker.image],
-        help="Docker image to be used.",
+        help="Docker image to be used (default: the image of the defaults file, or ubuntu:latest).",
+    )
+
+
+def add_subparser(subparser):
+    start_parser = subparser.add_parser("start", help="start help")
+    add_start_arguments(start_parser)
+    start_parser.add_argument(
+        "--no-pool",
+        action="store_true",
+        help="Do not claim a container prepared by devloy pool prepare.",
     )
     start_parser.set_defaults(func=start_verb_init)
 
 
-def start_verb_init(args, defaults, logger):
+def resolve_start(args, defaults, logger):
     """
-    Starting point of the start command
-
-    Logic:
+    Get the main project and the container of the current directory.
 
-    * Create command using arguments
-    * Find projects information:
-        * Get project:
-            * Try to read colcon.pkg
-            * Try to get repository name
+    :returns: StartCommand, ProjectsInfo, key of the lockfile
     """
     image = deduce_image(args, defaults)
 
     # Get projects information
     projects_info = ProjectsInfo(
-        logger, args.all_deps, args.repo, defaults.search_paths
+        logger,
+        args.all_deps,
+        args.repo,
+        defaults.search_paths,
+        cache=None if args.no_cache else ProjectCache(),
+        index=None if args.no_cache else SearchPathsIndex(defaults.search_paths),
     )
 
     # Get main project info to detect if docker container is already running.
@@ -277,9 +340,62 @@ def start_verb_init(args, defaults, logger):
         container_name = docker_container_name(project_name, branch)
     command = StartCommand(container_name, image, logger, defaults, args.tmp, args.X11)
 
+    key = {
+        "project": project_name,
+        "branch": branch,
+        "all_deps": args.all_deps,
+        "repos": args.repo,
+        "search_paths": defaults.search_paths,
+    }
+    return command, projects_info, key
+
+
+def resolve_mounts(args, logger, projects_info, key):
+    """
+    Resolve the projects, or reuse them from the lockfile if it is up to date.
+
+    :returns: projects info, tuple (mounts, CCDB_WORKTREE_APPLICATION string)
+    """
+    from .lockfile import LOCKFILE_NAME, Lockfile, searched_directories
+
+    lockfile = Lockfile()
+    locked = None
+    if not args.refresh and not args.no_cache:
+        locked = lockfile.load(key)
+    if locked:
+        logger.debug("Using the resolved projects of {}".format(LOCKFILE_NAME))
+        return locked["projects_info"], (locked["mounts"], locked["ccdb"])
+
+    info = projects_info.get_projects_info()
+    mounts = project_mounts(info)
+    # Every dependency and extra repository was looked up in the search paths, including the missing ones.
+    repositories = {repository for repository, _ in projects_info.dep_dirs}
+    searched = searched_directories(projects_info.search_paths, repositories)
+    lockfile.save(key, info, *mounts, searched=searched)
+    return info, mounts
+
+
+def start_verb_init(args, defaults, logger):
+    """
+    Starting point of the start command
+
+    Logic:
+
+    * Create command using arguments
+    * Find projects information:
+        * Get project:
+            * Try to read colcon.pkg
+            * Try to get repository name
+    * Claim a pooled container with the same arguments, or run a new one
+    """
+    command, projects_info, key = resolve_start(args, defaults, logger)
+
     if not command.exists_docker_container():
-        command.start_docker_container(projects_info.get_projects_info())
+        info, mounts = resolve_mounts(args, logger, projects_info, key)
+        projects_info.save_cache()
+        command.start_docker_container(info, mounts, use_pool=not args.no_pool)
     else:
+        projects_info.save_cache()
         command.exec_docker_container()
 
     del command
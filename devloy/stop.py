@@ -3,33 +3,34 @@
 
 from pathlib import Path
 import shutil
-import subprocess
-
-import yaml
 
+from .cache import ProjectCache
+from .docker import get_client
+from .index import SearchPathsIndex
 from .projects_info import ProjectsInfo
 from .utils import (docker_container_name, exists_docker_container,
-                    is_running_docker_container)
+                    is_running_docker_container, take_containers_snapshot)
 
 
 class StopCommand:
     container_name = None
     logger = None
+    snapshot = None
 
     def __init__(self, container_name, logger):
         self.container_name = container_name
         self.logger = logger
         self.logger.debug('Stopping development environment {}'.format(container_name))
 
+    def containers_snapshot(self):
+        if self.snapshot is None:
+            self.snapshot = take_containers_snapshot(self.container_name)
+        return self.snapshot
+
     def get_docker_container_info(self):
-        docker_inspect_proc = subprocess.Popen(
-                'docker inspect {}'.format(self.container_name),
-                stdout=subprocess.PIPE,
-                shell=True)
-
-        docker_inspect_proc.wait()
-        if 0 == docker_inspect_proc.returncode:
-            return yaml.safe_load(docker_inspect_proc.stdout)
+        info = self.containers_snapshot().get(self.container_name)
+        if info is not None:
+            return [info]
         return None
 
     def remove_tmp_directories(self, docker_info):
@@ -51,13 +52,12 @@ class StopCommand:
             install_dir_symlink.unlink()
 
     def remove_container(self):
-        if is_running_docker_container(self.container_name):
-            subprocess.call('docker stop {}'.format(self.container_name), shell=True)
-        subprocess.call('docker rm {}'.format(self.container_name), shell=True)
-        return True
+        if is_running_docker_container(self.container_name, self.containers_snapshot()):
+            get_client().stop_container(self.container_name)
+        return get_client().remove_container(self.container_name)
 
     def stop_docker_container(self):
-        if exists_docker_container(self.container_name):
+        if exists_docker_container(self.container_name, self.containers_snapshot()):
             # Get info about container:
             docker_info = self.get_docker_container_info()
             if self.remove_container() and docker_info:
@@ -76,10 +76,13 @@ def stop_verb_init(args, defaults, logger):
     Starting point of the stop command
     """
     # Get projects information
-    projects_info = ProjectsInfo(logger, False, [], defaults.search_paths)
+    projects_info = ProjectsInfo(logger, False, [], defaults.search_paths,
+                                 cache=None if args.no_cache else ProjectCache(),
+                                 index=None if args.no_cache else SearchPathsIndex(defaults.search_paths))
 
     # Get main project info to detect if docker container is already running.
     project_name, branch = projects_info.get_main_project_info()
+    projects_info.save_cache()
     command = StopCommand(docker_container_name(project_name, branch), logger)
 
     command.stop_docker_container()
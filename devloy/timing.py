@@ -0,0 +1,125 @@
+# Copyright 2019 Ricardo González
+# Licensed under the Apache License, Version 2.0
+
+"""
+Timing spans and counters of the phases of devloy and ccdb, enabled with --profile.
+When disabled, a span only costs a flag check. The report is a summary table printed to stderr, or a Chrome
+trace-event JSON file (chrome://tracing, Perfetto) if a path is given.
+"""
+import collections
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+SUMMARY = '-'
+
+_enabled = False
+_output = None
+_origin = time.perf_counter()
+_lock = threading.Lock()
+_spans = []  # (name, category, start, duration, thread id)
+_counters = collections.Counter()
+
+
+def enable(output=SUMMARY):
+    """
+    :param output: path of the Chrome trace file, or SUMMARY to print a table.
+    """
+    global _enabled, _output
+    _enabled = True
+    _output = output
+
+
+def is_enabled():
+    return _enabled
+
+
+@contextmanager
+def span(name, category='devloy'):
+    if not _enabled:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        with _lock:
+            _spans.append((name, category, start - _origin, duration, threading.get_ident()))
+
+
+def timed(name, category='devloy'):
+    """
+    Decorator wrapping each call of the function in a span.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name, category):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(name, value=1):
+    if _enabled:
+        with _lock:
+            _counters[name] += value
+
+
+def summary():
+    totals = collections.OrderedDict()
+    for name, category, start, duration, thread in sorted(_spans, key=lambda span: span[2]):
+        calls, total, maximum = totals.get(name, (0, 0.0, 0.0))
+        totals[name] = (calls + 1, total + duration, max(maximum, duration))
+
+    width = max([len(name) for name in totals] + [len(name) for name in _counters] + [len('span')])
+    lines = ['{:<{width}} {:>7} {:>11} {:>11} {:>11}'.format(
+        'span', 'calls', 'total (ms)', 'mean (ms)', 'max (ms)', width=width)]
+    for name, (calls, total, maximum) in totals.items():
+        lines.append('{:<{width}} {:>7} {:>11.3f} {:>11.3f} {:>11.3f}'.format(
+            name, calls, total * 1000, total * 1000 / calls, maximum * 1000, width=width))
+    if _counters:
+        lines.append('')
+        lines.append('{:<{width}} {:>7}'.format('counter', 'value', width=width))
+        for name in sorted(_counters):
+            lines.append('{:<{width}} {:>7}'.format(name, _counters[name], width=width))
+    return '\n'.join(lines)
+
+
+def trace_events():
+    pid = os.getpid()
+    events = [{
+        'name': name,
+        'cat': category,
+        'ph': 'X',
+        'ts': start * 1e6,
+        'dur': duration * 1e6,
+        'pid': pid,
+        'tid': thread
+        } for name, category, start, duration, thread in _spans]
+    end = max([start + duration for _, _, start, duration, _ in _spans] + [time.perf_counter() - _origin])
+    for name, value in sorted(_counters.items()):
+        events.append({'name': name, 'ph': 'C', 'ts': end * 1e6, 'pid': pid, 'args': {name: value}})
+    return events
+
+
+def report():
+    """
+    Write the report once. It has to be called before replacing the process with exec.
+    """
+    global _enabled
+    if not _enabled:
+        return
+    _enabled = False
+
+    if SUMMARY == _output:
+        sys.stderr.write(summary() + '\n')
+        sys.stderr.flush()
+    else:
+        with open(_output, 'w', encoding='utf-8') as trace_file:
+            json.dump({'traceEvents': trace_events(), 'displayTimeUnit': 'ms'}, trace_file)
@@ -1,37 +1,33 @@
 # Copyright 2019 Ricardo González
 # Licensed under the Apache License, Version 2.0
 
-import subprocess
+from . import timing
+from .docker import DEV_CONTAINER_PREFIX, ContainerSnapshot
 
 
 def docker_container_name(project_name, branch):
     return 'dev_{}_{}'.format(project_name, branch).replace('/', '-')
 
 
-def exists_docker_container(container_name):
-    exists = False
-    docker_ps_proc = subprocess.Popen(
-            'docker ps -q --all -f name={}'.format(container_name),
-            stdout=subprocess.PIPE,
-            shell=True)
-    docker_ps_proc.wait()
-    if 0 == docker_ps_proc.returncode:
-        exists = docker_ps_proc.stdout.readline().decode('utf-8').rstrip() != ''
+@timing.timed('containers snapshot')
+def take_containers_snapshot(container_name):
+    """
+    :returns: A snapshot of all development containers, including container_name even if it doesn't follow the
+        devloy naming.
+    """
+    if container_name.startswith(DEV_CONTAINER_PREFIX):
+        return ContainerSnapshot.take()
+    return ContainerSnapshot.take(container_name)
 
-    return exists
 
+def exists_docker_container(container_name, snapshot=None):
+    snapshot = snapshot if snapshot else take_containers_snapshot(container_name)
+    return snapshot.exists(container_name)
 
-def is_running_docker_container(container_name):
-    running = False
-    docker_ps_proc = subprocess.Popen(
-            'docker ps -q -f name={}'.format(container_name), # Problem with similar names
-            stdout=subprocess.PIPE,
-            shell=True)
-    docker_ps_proc.wait()
-    if 0 == docker_ps_proc.returncode:
-        running = docker_ps_proc.stdout.readline().decode('utf-8').rstrip() != ''
 
-    return running
+def is_running_docker_container(container_name, snapshot=None):
+    snapshot = snapshot if snapshot else take_containers_snapshot(container_name)
+    return snapshot.is_running(container_name)
 
 
 def deduce_image(arguments, defaults):
@@ -0,0 +1,77 @@
+# Copyright 2019 Ricardo González
+# Licensed under the Apache License, Version 2.0
+
+"""
+Library API to resolve workspaces in-process, without the devloy command line.
+Every call works on its own state, so several workspaces (e.g. one per branch) can be resolved concurrently. A
+ProjectCache and a SearchPathsIndex can be shared between calls, even concurrent ones. Each call sees the files changed
+before it started.
+
+    workspace = resolve_workspace('/path/to/project', search_paths=['/path/to/repos'])
+    workspace.container_name, workspace.mounts
+"""
+import logging
+import os
+from types import MappingProxyType
+
+from .projects_info import ProjectsInfo
+from .utils import docker_container_name
+
+
+def project_mounts(projects_info):
+    """
+    :returns: list of docker volumes of the projects, CCDB_WORKTREE_APPLICATION string of the projects
+    """
+    volumes = []
+    ccdb_env_string = ''
+    for project in projects_info:
+        info = projects_info.get(project)
+        volumes.append('{}:{}'.format(info[0], info[1]))
+        ccdb_env_string += '{}:{},'.format(info[0], info[1])
+    return volumes, ccdb_env_string
+
+
+class Workspace:
+    """
+    Immutable result of resolve_workspace().
+    """
+    __slots__ = ('name', 'branch', 'container_name', 'projects', 'mounts', 'ccdb', 'order', 'cycles', 'missing')
+
+    def __init__(self, name, branch, projects, graph):
+        setattr_ = super().__setattr__
+        setattr_('name', name)
+        setattr_('branch', branch)
+        setattr_('container_name', docker_container_name(name, branch))
+        # project name -> (project directory, project directory without the suffix)
+        setattr_('projects', MappingProxyType({project: tuple(info) for project, info in projects.items()}))
+        volumes, ccdb_env_string = project_mounts(projects)
+        setattr_('mounts', tuple(volumes))
+        setattr_('ccdb', ccdb_env_string)
+        setattr_('order', tuple(graph.topological_order()))
+        setattr_('cycles', tuple(tuple(cycle) for cycle in graph.find_cycles()))
+        setattr_('missing', tuple(node.name for node in graph.nodes.values() if node.directory is None))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Workspace is immutable')
+
+    def __delattr__(self, name):
+        raise AttributeError('Workspace is immutable')
+
+    def __repr__(self):
+        return 'Workspace({!r}, {!r}, {} projects)'.format(self.name, self.branch, len(self.projects))
+
+
+def resolve_workspace(path, search_paths, all_deps=False, extra_repos=(), cache=None, index=None, logger=None,
+                      max_workers=None):
+    """
+    Resolve the projects needed by the project in path, like `devloy start` does.
+    :param cache: ProjectCache, it can be shared between calls.
+    :param index: SearchPathsIndex of search_paths, it can be shared between calls.
+    :returns: Workspace
+    """
+    projects_info = ProjectsInfo(
+            logger if logger else logging.getLogger(__name__), all_deps, list(extra_repos), list(search_paths),
+            max_workers=max_workers, cache=cache, index=index, main_dir=os.path.abspath(path))
+    name, branch = projects_info.get_main_project_info()
+    projects = projects_info.get_projects_info()
+    return Workspace(name, branch, projects, projects_info.graph)
@@ -15,6 +15,5 @@ setup(
                 'devloy = devloy.core:main',
                 'ccdb = ccdb.core:main'
                 ]
-            },
-        install_requires=['fcache']
+            }
         )
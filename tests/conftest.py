@@ -0,0 +1,142 @@
+# Copyright 2019 Ricardo González
+# Licensed under the Apache License, Version 2.0
+
+"""
+Stand-ins for docker: a fake Docker Engine API served on a unix socket, and a fake docker command (tests/bin/docker).
+Both keep the containers as a dictionary {name: {'Id', 'Image', 'State', 'Mounts'}}.
+"""
+import json
+import os
+import re
+import socketserver
+import threading
+from http.server import BaseHTTPRequestHandler
+from pathlib import Path
+from urllib.parse import parse_qs, unquote, urlparse
+
+import pytest
+
+BIN_DIR = Path(__file__).parent / 'bin'
+
+
+class FakeDockerHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+            self.connection_number = self.server.connections
+
+    def send(self, status, body=None):
+        # Recorded before responding, so the client sees it once it has the response.
+        self.server.requests.append((self.command, self.path, self.connection_number))
+        data = json.dumps(body).encode('utf-8') if body is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        if data:
+            self.wfile.write(data)
+        if self.server.drop_connections:
+            # Close the kept-alive connection without telling the client, like an idle timeout of the daemon.
+            self.close_connection = True
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        containers = self.server.containers
+        if '/containers/json' == url.path:
+            filters = json.loads(query.get('filters', ['{}'])[0])
+            listed = []
+            for name, container in sorted(containers.items()):
+                if '1' != query.get('all', ['0'])[0] and 'running' != container['State']:
+                    continue
+                if all(re.search(pattern, '/' + name) for pattern in filters.get('name', [])):
+                    listed.append(dict(container, Names=['/' + name]))
+            return self.send(200, listed)
+
+        match = re.match(r'^/containers/([^/]+)/json$', url.path)
+        name = unquote(match.group(1)) if match else None
+        if name in containers:
+            container = containers[name]
+            return self.send(200, {'Id': container['Id'], 'Name': '/' + name, 'Mounts': container['Mounts'],
+                                   'Config': {'Image': container['Image']}, 'State': {'Status': container['State']}})
+        self.send(404, {'message': 'No such container'})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        match = re.match(r'^/containers/([^/]+)/(\w+)$', url.path)
+        name = unquote(match.group(1)) if match else None
+        container = self.server.containers.get(name)
+        if container is None:
+            return self.send(404, {'message': 'No such container'})
+        action = match.group(2)
+        if 'stop' == action:
+            if 'running' != container['State']:
+                return self.send(304)
+            container['State'] = 'exited'
+            return self.send(204)
+        if 'start' == action:
+            if 'running' == container['State']:
+                return self.send(304)
+            container['State'] = 'running'
+            return self.send(204)
+        if 'rename' == action:
+            new_name = parse_qs(url.query)['name'][0]
+            if new_name in self.server.containers:
+                return self.send(409, {'message': 'Conflict'})
+            self.server.containers[new_name] = self.server.containers.pop(name)
+            return self.send(204)
+        self.send(404, {'message': 'page not found'})
+
+    def do_DELETE(self):
+        name = unquote(urlparse(self.path).path[len('/containers/'):])
+        if self.server.containers.pop(name, None) is None:
+            return self.send(404, {'message': 'No such container'})
+        self.send(204)
+
+
+class FakeDockerServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, containers):
+        super().__init__(str(socket_path), FakeDockerHandler)
+        self.socket_path = str(socket_path)
+        self.containers = containers
+        self.requests = []  # (method, path, connection number)
+        self.connections = 0
+        self.lock = threading.Lock()
+        self.drop_connections = False
+
+
+def container(id, image='ubuntu:latest', state='running', mounts=None):
+    return {'Id': id, 'Image': image, 'State': state, 'Mounts': mounts if mounts else []}
+
+
+@pytest.fixture
+def docker_api(tmp_path):
+    """
+    Fake Docker Engine API. Its containers can be changed through server.containers.
+    """
+    server = FakeDockerServer(tmp_path / 'docker.sock', {})
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def docker_cli(tmp_path, monkeypatch):
+    """
+    Fake docker command, first in PATH.
+    :returns: Path of its state file, a JSON file with the containers.
+    """
+    state_path = tmp_path / 'docker-state.json'
+    state_path.write_text('{}')
+    monkeypatch.setenv('PATH', '{}{}{}'.format(BIN_DIR, os.pathsep, os.environ.get('PATH', '')))
+    monkeypatch.setenv('FAKE_DOCKER_STATE', str(state_path))
+    return state_path
@@ -0,0 +1,45 @@
+# Copyright 2020 Ricardo González
+# Licensed under the Apache License, Version 2.0
+
+import os
+
+from ccdb.colcon import ColconIndex
+
+
+def make_package(path, name):
+    path.mkdir(parents=True)
+    (path / 'colcon.pkg').write_text('name: {}\ntype: cmake\n'.format(name))
+
+
+def test_discover(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    make_package(tmp_path / 'src' / 'foo', 'foo')
+    make_package(tmp_path / 'src' / 'foo' / 'nested', 'nested')
+    (tmp_path / 'src' / 'bar').mkdir()
+    (tmp_path / 'src' / 'bar' / 'package.xml').write_text(
+            '<package><name>bar</name><export><build_type>ament_cmake</build_type></export></package>')
+    (tmp_path / 'src' / 'baz').mkdir()
+    (tmp_path / 'src' / 'baz' / 'CMakeLists.txt').write_text('cmake_minimum_required(VERSION 3.5)\nproject(baz)\n')
+    make_package(tmp_path / 'src' / 'ignored' / 'qux', 'qux')
+    (tmp_path / 'src' / 'ignored' / 'COLCON_IGNORE').write_text('')
+    make_package(tmp_path / 'build' / 'foo', 'foo_build')
+
+    index = ColconIndex.discover()
+
+    assert {
+        'foo': ('src/foo', '(cmake)'),
+        'bar': ('src/bar', '(ros.ament_cmake)'),
+        'baz': ('src/baz', '(cmake)'),
+    } == index.packages
+
+
+def test_discover_follows_links(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    make_package(tmp_path / 'repos' / 'foo', 'foo')
+    (tmp_path / 'ws').mkdir()
+    os.symlink(str(tmp_path / 'repos'), str(tmp_path / 'ws' / 'src'))
+    # A link back to an ancestor is not followed forever.
+    os.symlink(str(tmp_path / 'repos'), str(tmp_path / 'repos' / 'loop'))
+    monkeypatch.chdir(tmp_path / 'ws')
+
+    assert {'foo': ('src/foo', '(cmake)')} == ColconIndex.discover().packages
@@ -0,0 +1,70 @@
+# Copyright 2020 Ricardo González
+# Licensed under the Apache License, Version 2.0
+
+import json
+
+import pytest
+
+from ccdb import database
+from ccdb.database import DatabaseWriter, deduplicate_fragments, iter_entries
+
+ENTRIES = [
+    {'directory': '/ws/build/foo', 'file': '/ws/src/foo/a.cpp', 'arguments': ['c++', '-DNAME="[a, b]"', 'a.cpp']},
+    {'directory': '/ws/build/foo', 'file': '/ws/src/foo/ñandú.cpp', 'command': 'c++ -c "ñandú.cpp" {}'},
+    {'directory': '/ws/build/bar', 'file': '/ws/src/bar/b.cpp', 'command': 'c++ -c b.cpp', 'output': 'b.o'},
+]
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 7, 64, 1024 * 1024])
+@pytest.mark.parametrize('indent', [None, 2])
+def test_iter_entries_across_chunks(tmp_path, monkeypatch, chunk_size, indent):
+    monkeypatch.setattr(database, 'READ_CHUNK_SIZE', chunk_size)
+    database_path = tmp_path / 'compile_commands.json'
+    database_path.write_text('\n  ' + json.dumps(ENTRIES, indent=indent, ensure_ascii=False) + '\n', encoding='utf-8')
+
+    assert ENTRIES == list(iter_entries(database_path))
+
+
+def test_iter_entries_empty(tmp_path):
+    database_path = tmp_path / 'compile_commands.json'
+    database_path.write_text('[\n]\n')
+
+    assert [] == list(iter_entries(database_path))
+
+
+def test_iter_entries_truncated(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, 'READ_CHUNK_SIZE', 16)
+    database_path = tmp_path / 'compile_commands.json'
+    database_path.write_text(json.dumps(ENTRIES)[:-40])
+
+    with pytest.raises(ValueError):
+        list(iter_entries(database_path))
+
+
+def write_fragment(fragment_path, entries):
+    with DatabaseWriter(str(fragment_path), fragment=True) as writer:
+        for entry in entries:
+            writer.write(entry)
+    return str(fragment_path)
+
+
+def test_deduplicate_fragments(tmp_path):
+    newest = write_fragment(tmp_path / 'foo.merged', [
+        {'directory': '/ws/build/foo', 'file': 'a.cpp', 'command': 'c++ -O2 a.cpp',
+         'arguments': ['c++', '-O2', 'a.cpp']},
+    ])
+    oldest = write_fragment(tmp_path / 'bar.merged', [
+        {'directory': '/ws/build/foo', 'file': 'a.cpp', 'command': 'c++ -O0 a.cpp'},
+        {'directory': '/ws/build/bar', 'file': 'b.cpp', 'command': 'c++ -O0 b.cpp'},
+        {'directory': '/ws/build/baz', 'file': 'b.cpp', 'command': 'c++ -O1 b.cpp'},
+        {'directory': '/ws/build/bar', 'file': 'b.cpp', 'command': 'c++ -O2 b.cpp'},
+    ])
+    output_path = str(tmp_path / 'compile_commands.json')
+
+    assert 2 == deduplicate_fragments([newest, oldest], output_path)
+    # The entry of the newest fragment wins, and inside a fragment the last one, e.g. regenerated by a build.
+    assert [
+        {'directory': '/ws/build/foo', 'file': 'a.cpp', 'arguments': ['c++', '-O2', 'a.cpp']},
+        {'directory': '/ws/build/baz', 'file': 'b.cpp', 'command': 'c++ -O1 b.cpp'},
+        {'directory': '/ws/build/bar', 'file': 'b.cpp', 'command': 'c++ -O2 b.cpp'},
+    ] == list(iter_entries(output_path))
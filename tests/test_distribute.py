@@ -0,0 +1,66 @@
+# Copyright 2020 Ricardo González
+# Licensed under the Apache License, Version 2.0
+
+import logging
+import os
+
+from ccdb.distribute import distribute
+
+logger = logging.getLogger(__name__)
+
+
+def make_targets(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    source_path = tmp_path / 'ccdb.json'
+    source_path.write_text('[\n]\n')
+    for project in ('foo', 'bar'):
+        (tmp_path / 'src' / project).mkdir(parents=True)
+    return str(source_path), [str(tmp_path / 'src' / 'foo' / 'compile_commands.json'),
+                              os.path.join('src', 'foo', 'compile_commands.json'),
+                              os.path.join('src', 'bar', '..', 'bar', 'compile_commands.json')]
+
+
+def test_targets_are_distinct_files(tmp_path, monkeypatch, caplog):
+    source_path, target_paths = make_targets(tmp_path, monkeypatch)
+    targets_info = {}
+
+    with caplog.at_level(logging.DEBUG, logger=__name__):
+        distribute(source_path, target_paths, targets_info, logger)
+
+    # The same target given by several paths is updated once.
+    assert 2 == len([record for record in caplog.records if record.getMessage().startswith('\tUpdated')])
+    assert sorted(os.path.realpath(target_path) for target_path in target_paths[1:]) == sorted(targets_info)
+    inodes = {os.stat(path).st_ino for path in [source_path] + target_paths}
+    assert 3 == len(inodes)
+
+    with open(target_paths[0], 'a', encoding='utf-8') as target:
+        target.write('\n')
+    with open(source_path, 'r', encoding='utf-8') as source:
+        assert '[\n]\n' == source.read()
+
+
+def test_hardlinked_targets(tmp_path, monkeypatch, caplog):
+    source_path, target_paths = make_targets(tmp_path, monkeypatch)
+
+    with caplog.at_level(logging.DEBUG, logger=__name__):
+        distribute(source_path, target_paths, {}, logger, hardlink=True)
+
+    # Without reflinks (e.g. tmpfs or ext4) the targets are links of the database instead of copies.
+    methods = {record.getMessage().rsplit(' ', 1)[1] for record in caplog.records}
+    assert methods in ({'(reflink)'}, {'(hardlink)'})
+    if {'(hardlink)'} == methods:
+        assert 3 == os.stat(source_path).st_nlink
+
+
+def test_unchanged_targets_are_kept(tmp_path, monkeypatch, caplog):
+    source_path, target_paths = make_targets(tmp_path, monkeypatch)
+    targets_info = {}
+    distribute(source_path, target_paths, targets_info, logger)
+    stamps = [os.stat(target_path) for target_path in target_paths]
+
+    with caplog.at_level(logging.DEBUG, logger=__name__):
+        distribute(source_path, target_paths, targets_info, logger)
+
+    assert [(stat.st_ino, stat.st_mtime_ns) for stat in stamps] == [
+        (os.stat(target_path).st_ino, os.stat(target_path).st_mtime_ns) for target_path in target_paths]
+    assert not [record for record in caplog.records if record.getMessage().startswith('\tUpdated')]
@@ -0,0 +1,111 @@
+# Copyright 2019 Ricardo González
+# Licensed under the Apache License, Version 2.0
+
+import json
+
+from conftest import container
+
+from devloy import docker
+from devloy.core import main
+from devloy.docker import ContainerSnapshot, DockerClient
+
+
+def test_list_containers_api(docker_api):
+    docker_api.containers.update({
+        'dev_foo_main': container('1', mounts=[{'Source': '/tmp/b', 'Destination': '/home/u/workspace/build'}]),
+        'dev_foo_other': container('2', state='exited'),
+        'other': container('3'),
+    })
+    client = DockerClient(docker_api.socket_path)
+
+    assert ['1', '3'] == [info['Id'] for info in client.list_containers()]
+    listed = client.list_containers(all=True, filters={'name': ['^/dev_']})
+    assert ['/dev_foo_main', '/dev_foo_other'] == [info['Names'][0] for info in listed]
+    assert '/tmp/b' == listed[0]['Mounts'][0]['Source']
+
+
+def test_connection_is_kept_alive(docker_api):
+    docker_api.containers['dev_foo_main'] = container('1')
+    client = DockerClient(docker_api.socket_path)
+
+    client.list_containers()
+    client.inspect_container('dev_foo_main')
+    client.inspect_container('missing')
+
+    assert 3 == len(docker_api.requests)
+    assert 1 == len({connection for _, _, connection in docker_api.requests})
+
+
+def test_request_is_retried_on_a_closed_connection(docker_api):
+    docker_api.containers['dev_foo_main'] = container('1')
+    docker_api.drop_connections = True
+    client = DockerClient(docker_api.socket_path)
+
+    assert 'running' == client.inspect_container('dev_foo_main')['State']['Status']
+    assert 'running' == client.inspect_container('dev_foo_main')['State']['Status']
+    assert client.stop_container('dev_foo_main')
+    assert client.remove_container('dev_foo_main')
+    assert not docker_api.containers
+    # Every request after the first one found its connection closed and was sent again in a new one.
+    assert 4 == len({connection for _, _, connection in docker_api.requests})
+
+
+def test_snapshot(docker_api):
+    docker_api.containers.update({
+        'dev_foo_main': container('1'),
+        'dev_foo_other': container('2', state='exited'),
+        'other': container('3'),
+    })
+    snapshot = ContainerSnapshot.take(client=DockerClient(docker_api.socket_path))
+
+    assert ['dev_foo_main', 'dev_foo_other'] == snapshot.names()
+    assert snapshot.is_running('dev_foo_main')
+    assert snapshot.exists('dev_foo_other') and not snapshot.is_running('dev_foo_other')
+    assert not snapshot.exists('other')
+    assert 1 == len(docker_api.requests)
+
+
+def test_cli_fallback(docker_cli, tmp_path):
+    docker_cli.write_text(json.dumps({
+        'dev_foo_main': container('1', mounts=[{'Source': '/tmp/b', 'Destination': '/home/u/workspace/build'}]),
+        'dev_foo_other': container('2', image='foo:1', state='exited'),
+        'other': container('3'),
+    }))
+    # Without a socket the client falls back to the docker command.
+    client = DockerClient(str(tmp_path / 'missing.sock'))
+
+    snapshot = ContainerSnapshot.take(client=client)
+    assert client.use_cli
+    assert ['dev_foo_main', 'dev_foo_other'] == snapshot.names()
+    assert 'exited' == snapshot.state('dev_foo_other')
+    assert 'foo:1' == snapshot.get('dev_foo_other')['Image']
+    assert '/tmp/b' == snapshot.mounts('dev_foo_main')[0]['Source']
+    assert client.inspect_container('missing') is None
+
+    assert client.stop_container('dev_foo_main')
+    assert client.remove_container('dev_foo_main')
+    assert ['dev_foo_other', 'other'] == sorted(json.loads(docker_cli.read_text()))
+
+
+def test_cli_container_removed_after_ps(docker_cli, tmp_path):
+    docker_cli.write_text(json.dumps({
+        'dev_foo_main': container('1'),
+        'dev_foo_removed': dict(container('2'), Removed=True),
+    }))
+    snapshot = ContainerSnapshot.take(client=DockerClient(use_cli=True))
+
+    assert ['dev_foo_main'] == snapshot.names()
+
+
+def test_verb_fails_without_daemon(docker_cli, tmp_path, monkeypatch):
+    project_dir = tmp_path / 'foo'
+    project_dir.mkdir()
+    (project_dir / 'colcon.pkg').write_text('name: foo\n')
+    monkeypatch.chdir(project_dir)
+    monkeypatch.setenv('HOME', str(tmp_path))
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    monkeypatch.setenv('DOCKER_HOST', 'unix://{}'.format(tmp_path / 'missing.sock'))
+    monkeypatch.setenv('FAKE_DOCKER_DOWN', '1')
+    monkeypatch.setattr(docker, '_client', None)
+
+    assert 1 == main(['stop'])
@@ -0,0 +1,110 @@
+# Copyright 2019 Ricardo González
+# Licensed under the Apache License, Version 2.0
+
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from devloy import git
+
+pytestmark = pytest.mark.skipif(shutil.which('git') is None, reason='git is not installed')
+
+
+def run_git(cwd, *args):
+    return subprocess.run(
+            ['git', '-c', 'user.name=devloy', '-c', 'user.email=devloy@example.com',
+             '-c', 'protocol.file.allow=always', '-c', 'init.defaultBranch=master'] + list(args),
+            cwd=str(cwd), check=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL).stdout.decode('utf-8').strip()
+
+
+def make_repository(path, url):
+    path.mkdir(parents=True)
+    run_git(path, 'init', '-q')
+    run_git(path, 'remote', 'add', 'origin', url)
+    (path / 'README').write_text('readme\n')
+    run_git(path, 'add', 'README')
+    run_git(path, 'commit', '-q', '-m', 'first')
+    return path
+
+
+def test_main_worktree(tmp_path):
+    repo = make_repository(tmp_path / 'foo' / 'master', 'https://git.example.com/foo.git')
+
+    assert (str(repo / '.git'), str(repo / '.git')) == git.resolve_git_dirs(str(repo / '.git'))
+    assert 'master' == git.current_branch(str(repo))
+    assert 'master' == git.current_branch(str(repo / 'README'))
+    assert 'https://git.example.com/foo.git' == git.remote_url(str(repo))
+    assert git.remote_url(str(repo), 'upstream') is None
+
+
+def test_linked_worktree(tmp_path):
+    repo = make_repository(tmp_path / 'foo' / 'master', 'https://git.example.com/foo.git')
+    worktree = tmp_path / 'foo' / 'feature'
+    run_git(repo, 'worktree', 'add', '-q', '-b', 'feature/x', str(worktree))
+
+    git_dir, common_dir = git.resolve_git_dirs(str(worktree / '.git'))
+    assert os.path.realpath(run_git(worktree, 'rev-parse', '--absolute-git-dir')) == os.path.realpath(git_dir)
+    assert os.path.realpath(repo / '.git') == os.path.realpath(common_dir)
+    assert 'feature/x' == git.current_branch(str(worktree))
+    assert 'https://git.example.com/foo.git' == git.remote_url(str(worktree))
+
+
+def test_submodule(tmp_path):
+    library = make_repository(tmp_path / 'library', 'https://git.example.com/library.git')
+    repo = make_repository(tmp_path / 'foo', 'https://git.example.com/foo.git')
+    run_git(repo, 'submodule', 'add', '-q', str(library), 'library')
+    submodule = repo / 'library'
+
+    git_dir, common_dir = git.resolve_git_dirs(str(submodule / '.git'))
+    assert os.path.realpath(repo / '.git' / 'modules' / 'library') == os.path.realpath(git_dir)
+    assert git_dir == common_dir
+    assert run_git(submodule, 'branch', '--show-current') == git.current_branch(str(submodule))
+    assert str(library) == git.remote_url(str(submodule))
+
+
+def test_detached_head(tmp_path):
+    repo = make_repository(tmp_path / 'foo', 'https://git.example.com/foo.git')
+    run_git(repo, 'checkout', '-q', '--detach')
+
+    assert '' == git.current_branch(str(repo))
+
+
+def test_not_a_repository(tmp_path):
+    assert git.current_branch(str(tmp_path)) is None
+    assert git.remote_url(str(tmp_path)) is None
+
+
+def test_read_config(tmp_path):
+    config_path = tmp_path / 'config'
+    config_path.write_text(
+            '[core]\n'
+            '\tbare = false\n'
+            '[remote "origin"]\n'
+            '\turl = "https://git.example.com/foo.git"\n'
+            '\tfetch = +refs/heads/*:refs/remotes/origin/*\n'
+            '# comment\n'
+            '[Branch "feature/x"] remote = origin\n'
+            '\tRebase\n')
+
+    assert {
+        ('core', None): {'bare': ['false']},
+        ('remote', 'origin'): {'url': ['https://git.example.com/foo.git'],
+                               'fetch': ['+refs/heads/*:refs/remotes/origin/*']},
+        ('branch', 'feature/x'): {'remote': ['origin'], 'rebase': [None]},
+    } == git.read_config(str(config_path))
+
+
+@pytest.mark.parametrize('content', [
+    '[include]\n\tpath = other\n',
+    '[remote.origin]\n\turl = foo\n',
+    '[remote "origin"]\n\turl = foo \\\n\tbar\n',
+    '[remote "origin"]\n\turl = "foo\\tbar"\n',
+    '[remote "origin"]\n\turl = foo ; comment\n',
+])
+def test_read_config_unsupported(tmp_path, content):
+    config_path = tmp_path / 'config'
+    config_path.write_text(content)
+
+    assert git.read_config(str(config_path)) is None
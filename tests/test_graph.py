@@ -0,0 +1,91 @@
+# Copyright 2019 Ricardo González
+# Licensed under the Apache License, Version 2.0
+
+import json
+
+from devloy.graph import COLCON, DEPENDENCY, MAIN, MISSING, REPOS, DependencyGraph
+
+
+def make_graph(edges, main='app'):
+    graph = DependencyGraph()
+    for source in edges:
+        graph.add_node(source, '/ws/{}'.format(source), None, MAIN if main == source else DEPENDENCY)
+    for source, targets in edges.items():
+        for target in targets:
+            graph.add_edge(source, target, COLCON)
+    return graph
+
+
+def assert_dependencies_first(graph, order):
+    position = {name: index for index, name in enumerate(order)}
+    cycles = {name: set(cycle) for cycle in graph.find_cycles() for name in cycle}
+    for source, targets in graph.edges.items():
+        for target in targets:
+            if target not in cycles.get(source, ()):
+                assert position[target] < position[source], (source, target)
+
+
+def test_acyclic_graph():
+    graph = make_graph({
+        'app': ['core', 'utils', 'ui'],
+        'ui': ['core'],
+        'core': ['utils'],
+        'utils': [],
+        'tool': ['utils'],
+    })
+
+    assert [] == graph.find_cycles()
+    order = graph.topological_order()
+    assert sorted(graph.nodes) == sorted(order)
+    assert_dependencies_first(graph, order)
+    assert 'utils' == order[0]
+
+
+def test_cycles():
+    graph = make_graph({
+        'app': ['a', 'self'],
+        'a': ['b'],
+        'b': ['c', 'd'],
+        'c': ['a'],
+        'd': ['e'],
+        'e': ['d', 'f'],
+        'f': [],
+        'self': ['self'],
+    })
+
+    assert [['a', 'b', 'c'], ['d', 'e'], ['self']] == sorted(graph.find_cycles())
+    order = graph.topological_order()
+    assert sorted(graph.nodes) == sorted(order)
+    assert_dependencies_first(graph, order)
+    assert 'app' == order[-1]
+
+
+def test_long_chain():
+    # Deeper than the recursion limit.
+    names = ['p{}'.format(index) for index in range(5000)]
+    graph = make_graph({name: names[index + 1:index + 2] for index, name in enumerate(names)}, main='p0')
+
+    assert [] == graph.find_cycles()
+    assert list(reversed(names)) == graph.topological_order()
+
+    graph.add_edge(names[-1], names[0], REPOS)
+    assert [sorted(names)] == graph.find_cycles()
+
+
+def test_missing_projects():
+    graph = make_graph({'app': ['found'], 'found': []})
+    graph.add_node('lost', None, 'master', MISSING)
+    graph.add_edge('app', 'lost', REPOS)
+    graph.add_edge('app', 'found', REPOS)
+    # A missing project found later is replaced, a found one is kept.
+    graph.add_node('found', '/other/found', None, MISSING)
+    graph.add_node('lost', '/ws/lost', None, DEPENDENCY)
+
+    assert '/ws/found' == graph.nodes['found'].directory
+    assert '/ws/lost' == graph.nodes['lost'].directory
+    # The colcon dependency is kept over the repos one.
+    assert {'found': COLCON, 'lost': REPOS} == graph.edges['app']
+    assert ['found', 'lost', 'app'] == graph.topological_order()
+    exported = json.loads(graph.to_json())
+    assert ['found', 'lost', 'app'] == exported['order']
+    assert [] == exported['cycles']
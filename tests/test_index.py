@@ -0,0 +1,73 @@
+# Copyright 2019 Ricardo González
+# Licensed under the Apache License, Version 2.0
+
+import os
+
+from devloy.index import SearchPathsIndex
+
+
+def make_worktree(path, branch):
+    (path / '.git').mkdir(parents=True)
+    (path / '.git' / 'HEAD').write_text('ref: refs/heads/{}\n'.format(branch))
+
+
+def test_find_across_search_paths(tmp_path):
+    first = tmp_path / 'first'
+    second = tmp_path / 'second'
+    make_worktree(first / 'foo' / 'master', 'master')
+    make_worktree(first / 'foo' / 'fix', 'bugfix/crash')
+    make_worktree(second / 'foo' / 'master', 'master')
+    make_worktree(second / 'bar' / 'master', 'master')
+    (second / 'baz').mkdir()
+    index = SearchPathsIndex([first, second], tmp_path / 'index.json')
+
+    # The first search path containing the repository wins.
+    assert (first / 'foo' / 'master', 'master') == index.find('foo', None)
+    assert (second / 'bar' / 'master', 'master') == index.find('bar', 'master')
+    # A worktree is found by its directory or by its branch, else the repository directory is used.
+    assert (first / 'foo' / 'fix', 'fix') == index.find('foo', 'fix')
+    assert (first / 'foo' / 'fix', 'fix') == index.find('foo', 'bugfix/crash')
+    assert (first / 'foo', None) == index.find('foo', 'other')
+    assert (second / 'baz', None) == index.find('baz', None)
+    assert (None, None) == index.find('missing', None)
+
+
+def test_find_nested_worktree(tmp_path):
+    make_worktree(tmp_path / 'foo' / 'master', 'master')
+    make_worktree(tmp_path / 'foo' / 'feature' / 'x', 'feature/x')
+    index = SearchPathsIndex([tmp_path], tmp_path / 'index.json')
+
+    assert (tmp_path / 'foo' / 'feature' / 'x', 'feature/x') == index.find('foo', 'feature/x')
+
+
+def test_find_sees_changes(tmp_path):
+    search_path = tmp_path / 'repos'
+    make_worktree(search_path / 'foo' / 'master', 'master')
+    # Directory mtimes are coarse, so they are set back for the changes below to be seen.
+    os.utime(search_path, ns=(0, 0))
+    os.utime(search_path / 'foo', ns=(0, 0))
+    index = SearchPathsIndex([search_path], tmp_path / 'index.json')
+    assert (search_path / 'foo', None) == index.find('foo', 'fix')
+    index.save()
+
+    make_worktree(search_path / 'foo' / 'fix', 'fix')
+    make_worktree(search_path / 'bar' / 'master', 'master')
+    index = SearchPathsIndex([search_path], tmp_path / 'index.json')
+
+    assert (search_path / 'foo' / 'fix', 'fix') == index.find('foo', 'fix')
+    assert (search_path / 'bar' / 'master', 'master') == index.find('bar', None)
+
+
+def test_find_sees_checked_out_branches(tmp_path):
+    make_worktree(tmp_path / 'foo' / 'master', 'master')
+    make_worktree(tmp_path / 'foo' / 'fix', 'bugfix/crash')
+    index = SearchPathsIndex([tmp_path], tmp_path / 'index.json')
+    assert (tmp_path / 'foo' / 'fix', 'fix') == index.find('foo', 'bugfix/crash')
+    index.save()
+
+    # Checking out another branch doesn't change any directory mtime.
+    (tmp_path / 'foo' / 'fix' / '.git' / 'HEAD').write_text('ref: refs/heads/bugfix/hang\n')
+    index = SearchPathsIndex([tmp_path], tmp_path / 'index.json')
+
+    assert (tmp_path / 'foo', None) == index.find('foo', 'bugfix/crash')
+    assert (tmp_path / 'foo' / 'fix', 'fix') == index.find('foo', 'bugfix/hang')
@@ -0,0 +1,91 @@
+# Copyright 2019 Ricardo González
+# Licensed under the Apache License, Version 2.0
+
+import os
+
+import pytest
+
+from devloy.lockfile import Lockfile, searched_directories
+
+KEY = {'project': 'foo', 'branch': 'master', 'all_deps': False, 'repos': [], 'search_paths': []}
+
+
+@pytest.fixture
+def locked(tmp_path):
+    """
+    Lockfile of foo depending on bar, with baz searched but not found.
+    :returns: Lockfile, path of the search path
+    """
+    search_path = tmp_path / 'repos'
+    projects_info = {}
+    for name in ('foo', 'bar'):
+        project_dir = search_path / name / 'master'
+        project_dir.mkdir(parents=True)
+        (project_dir / 'colcon.pkg').write_text('name: {}\n'.format(name))
+        projects_info[name] = [str(project_dir), str(search_path / name)]
+    (search_path / 'foo' / 'master' / 'foo.repos').write_text('repositories:\n  bar:\n    type: git\n')
+    # Directory mtimes are coarse, so they are set back for the changes done by the tests to be seen.
+    for name in ('foo', 'bar'):
+        os.utime(search_path / name, ns=(0, 0))
+
+    lockfile = Lockfile(str(tmp_path / 'foo.lock'))
+    searched = searched_directories([search_path], ['bar', 'baz'])
+    lockfile.save(KEY, projects_info, ['mounts'], 'ccdb', searched=searched)
+    assert lockfile.load(KEY)['projects_info'] == projects_info
+    return lockfile, search_path
+
+
+def test_other_key(locked):
+    lockfile, search_path = locked
+
+    assert lockfile.load(dict(KEY, all_deps=True)) is None
+
+
+def test_colcon_pkg_changed(locked):
+    lockfile, search_path = locked
+    (search_path / 'bar' / 'master' / 'colcon.pkg').write_text('name: bar\ndependencies: [baz]\n')
+
+    assert lockfile.load(KEY) is None
+
+
+def test_repos_file_changed(locked):
+    lockfile, search_path = locked
+    (search_path / 'foo' / 'master' / 'foo.repos').write_text('repositories:\n  baz:\n    type: git\n')
+
+    assert lockfile.load(KEY) is None
+
+
+def test_repos_file_added(locked):
+    lockfile, search_path = locked
+    (search_path / 'bar' / 'master' / 'bar.repos').write_text('repositories: {}\n')
+
+    assert lockfile.load(KEY) is None
+
+
+def test_other_files_are_ignored(locked):
+    lockfile, search_path = locked
+    (search_path / 'bar' / 'master' / 'README').write_text('bar\n')
+
+    assert lockfile.load(KEY) is not None
+
+
+def test_worktree_added(locked):
+    lockfile, search_path = locked
+    (search_path / 'bar' / 'feature').mkdir()
+
+    assert lockfile.load(KEY) is None
+
+
+def test_missing_repository_added(locked):
+    lockfile, search_path = locked
+    (search_path / 'baz' / 'master').mkdir(parents=True)
+
+    assert lockfile.load(KEY) is None
+
+
+def test_project_removed(locked):
+    lockfile, search_path = locked
+    os.remove(search_path / 'bar' / 'master' / 'colcon.pkg')
+    os.rmdir(search_path / 'bar' / 'master')
+
+    assert lockfile.load(KEY) is None
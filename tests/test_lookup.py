@@ -0,0 +1,79 @@
+# Copyright 2020 Ricardo González
+# Licensed under the Apache License, Version 2.0
+
+import json
+import os
+
+import pytest
+
+from ccdb import core
+from ccdb.index import HEADER, INDEX_SUFFIX, RECORD, entry_file, lookup
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """
+    Generate with ccdb a database whose paths are not ASCII, and some of them relative to their directory.
+    :returns: path of the database
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv('CCDB_WORKTREE', raising=False)
+    monkeypatch.delenv('CCDB_WORKTREE_APPLICATION', raising=False)
+    for package, files in (('foo', ['ñandú.cpp', 'b.cpp']), ('bär', ['日本.cpp', '../bär/ü.cpp'])):
+        build_dir = tmp_path / 'build' / package
+        build_dir.mkdir(parents=True)
+        source_dir = tmp_path / 'src' / package
+        source_dir.mkdir(parents=True)
+        (build_dir / 'compile_commands.json').write_text(json.dumps([
+            {'directory': str(source_dir), 'file': file_name, 'command': 'c++ -c {}'.format(file_name)}
+            for file_name in files], ensure_ascii=False), encoding='utf-8')
+    core.main([])
+    return str(tmp_path / 'compile_commands.json')
+
+
+def test_index_offsets(database):
+    with open(database, 'rb') as database_file:
+        content = database_file.read()
+    with open(database + INDEX_SUFFIX, 'rb') as index_file:
+        index = index_file.read()
+    magic, num_records, size, mtime = HEADER.unpack_from(index)
+    records = list(RECORD.iter_unpack(index[HEADER.size:]))
+
+    assert 4 == num_records == len(records)
+    assert len(content) == size
+    # Every record points to exactly the bytes of one entry.
+    entries = [json.loads(content[offset:offset + length]) for _, offset, length in records]
+    with open(database, 'r', encoding='utf-8') as database_file:
+        assert sorted(map(json.dumps, json.load(database_file))) == sorted(map(json.dumps, entries))
+
+
+def test_lookup_non_ascii(database, tmp_path, monkeypatch):
+    entries = lookup(database, str(tmp_path / 'src' / 'foo' / 'ñandú.cpp'))
+    assert ['c++ -c ñandú.cpp'] == [entry['command'] for entry in entries]
+
+    # Relative files are looked up joined to their directory.
+    monkeypatch.chdir(tmp_path / 'src')
+    entries = lookup(database, os.path.join('bär', 'ü.cpp'))
+    assert [str(tmp_path / 'src' / 'bär' / 'ü.cpp')] == [entry_file(entry) for entry in entries]
+
+    assert [] == lookup(database, 'missing.cpp')
+
+
+def test_lookup_stale_index(database, tmp_path):
+    with open(database, 'a', encoding='utf-8') as database_file:
+        database_file.write('\n')
+
+    assert lookup(database, str(tmp_path / 'src' / 'foo' / 'b.cpp')) is None
+
+
+def test_lookup_verb(database, tmp_path, capsys):
+    assert 0 == core.main(['lookup', str(tmp_path / 'src' / 'bär' / '日本.cpp'), '--database', database])
+    assert ['c++ -c 日本.cpp'] == [entry['command'] for entry in json.loads(capsys.readouterr().out)]
+
+    # Without a valid index the database is scanned.
+    os.remove(database + INDEX_SUFFIX)
+    assert 0 == core.main(['lookup', str(tmp_path / 'src' / 'bär' / '日本.cpp'), '--database', database])
+    assert ['c++ -c 日本.cpp'] == [entry['command'] for entry in json.loads(capsys.readouterr().out)]
+
+    assert 1 == core.main(['lookup', str(tmp_path / 'src' / 'missing.cpp'), '--database', database])
+    assert 1 == core.main(['lookup', 'a.cpp', '--database', str(tmp_path / 'missing.json')])
@@ -0,0 +1,85 @@
+# Copyright 2020 Ricardo González
+# Licensed under the Apache License, Version 2.0
+
+import json
+import os
+
+import pytest
+
+from ccdb import core
+from ccdb.manifest import Manifest
+
+
+def write_database(build_dir, package, files):
+    database_path = build_dir / package / 'compile_commands.json'
+    database_path.parent.mkdir(parents=True, exist_ok=True)
+    database_path.write_text(json.dumps([
+        {'directory': str(build_dir / package), 'file': '/ws/src/{}/{}'.format(package, file_name),
+         'command': 'c++ -c {}'.format(file_name)} for file_name in files]))
+
+
+def merged_fragments(manifest):
+    """
+    :returns: {package: inode of its merged fragment}, a rewritten fragment is a new file.
+    """
+    return {package: os.stat(manifest.fragment_path(package, 'merged')).st_ino for package in manifest.packages}
+
+
+def merged_files():
+    with open('compile_commands.json', 'r', encoding='utf-8') as database_file:
+        return sorted(entry['file'] for entry in json.load(database_file))
+
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv('CCDB_WORKTREE', raising=False)
+    monkeypatch.delenv('CCDB_WORKTREE_APPLICATION', raising=False)
+    build_dir = tmp_path / 'build'
+    write_database(build_dir, 'foo', ['a.cpp', 'b.cpp'])
+    write_database(build_dir, 'bar', ['c.cpp'])
+    write_database(build_dir, 'baz', ['d.cpp'])
+    core.main([])
+    return build_dir
+
+
+def test_only_changed_packages_are_merged(workspace):
+    before = merged_fragments(Manifest('build'))
+    assert {'foo', 'bar', 'baz'} == set(before)
+
+    write_database(workspace, 'foo', ['a.cpp', 'b.cpp', 'e.cpp'])
+    core.main([])
+
+    after = merged_fragments(Manifest('build'))
+    assert before['foo'] != after['foo']
+    assert before['bar'] == after['bar'] and before['baz'] == after['baz']
+    assert ['/ws/src/bar/c.cpp', '/ws/src/baz/d.cpp', '/ws/src/foo/a.cpp', '/ws/src/foo/b.cpp',
+            '/ws/src/foo/e.cpp'] == merged_files()
+
+
+def test_touched_package_with_same_content_is_not_merged(workspace):
+    before = merged_fragments(Manifest('build'))
+
+    database_path = workspace / 'bar' / 'compile_commands.json'
+    os.utime(database_path, ns=(1, 1))
+    core.main([])
+
+    assert before == merged_fragments(Manifest('build'))
+
+
+def test_removed_package_is_dropped(workspace):
+    os.remove(workspace / 'baz' / 'compile_commands.json')
+    core.main([])
+
+    manifest = Manifest('build')
+    assert {'foo', 'bar'} == set(manifest.packages)
+    assert not os.path.exists(manifest.fragment_path('baz', 'merged'))
+    assert ['/ws/src/bar/c.cpp', '/ws/src/foo/a.cpp', '/ws/src/foo/b.cpp'] == merged_files()
+
+
+def test_full_merges_everything(workspace):
+    before = merged_fragments(Manifest('build'))
+    core.main(['--full'])
+
+    after = merged_fragments(Manifest('build'))
+    assert all(before[package] != after[package] for package in before)
@@ -0,0 +1,55 @@
+# Copyright 2020 Ricardo González
+# Licensed under the Apache License, Version 2.0
+
+import json
+
+from ccdb.partition import ProjectPartitioner, write_project_databases
+
+PREFIXES = {'/ws/src/foo/': '/home/u/foo', '/ws/src/bar/': '/home/u/bar', '/ws/src/common/': '/home/u/common',
+            '/ws/src/foo/vendor/': '/home/u/vendor'}
+
+
+def entry(directory, file_name):
+    return {'directory': directory, 'file': file_name, 'command': 'c++ -c {}'.format(file_name)}
+
+
+ENTRIES = [
+    entry('/ws/build/foo', '/ws/src/foo/a.cpp'),
+    entry('/ws/build/foo', '../../src/foo/b.cpp'),
+    entry('/ws/src/bar', 'c.cpp'),
+    entry('/ws/build/foo', '/ws/src/foo/vendor/d.cpp'),
+    entry('/ws/build/common', '../../src/common/e.cpp'),
+    entry('/ws/build/other', '/ws/src/other/f.cpp'),
+]
+
+
+def partition(tmp_path, projects, deps=()):
+    database_path = tmp_path / 'ccdb.json'
+    database_path.write_text(json.dumps(ENTRIES))
+    output_paths = write_project_databases(
+            str(database_path), ProjectPartitioner(PREFIXES), projects, set(deps), str(tmp_path / 'projects'))
+    files = {}
+    for project, output_path in output_paths.items():
+        with open(output_path, 'r', encoding='utf-8') as database_file:
+            files[project] = [entry['file'] for entry in json.load(database_file)]
+    return files
+
+
+def test_entries_go_to_their_project(tmp_path):
+    assert {
+        '/home/u/foo': ['/ws/src/foo/a.cpp', '../../src/foo/b.cpp'],
+        '/home/u/bar': ['c.cpp'],
+        '/home/u/vendor': ['/ws/src/foo/vendor/d.cpp'],
+    } == partition(tmp_path, {'/home/u/foo', '/home/u/bar', '/home/u/vendor'})
+
+
+def test_dependencies_go_to_every_project(tmp_path):
+    assert {
+        '/home/u/foo': ['/ws/src/foo/a.cpp', '../../src/foo/b.cpp', '../../src/common/e.cpp'],
+        '/home/u/bar': ['c.cpp', '../../src/common/e.cpp'],
+    } == partition(tmp_path, {'/home/u/foo', '/home/u/bar'}, deps=['/home/u/common'])
+
+
+def test_projects_without_entries_are_skipped(tmp_path):
+    assert {'/home/u/bar': ['c.cpp']} == partition(tmp_path, {'/home/u/bar', '/home/u/empty'})
+    assert not [path for path in (tmp_path / 'projects').iterdir() if 'empty' in path.name]
@@ -0,0 +1,70 @@
+# Copyright 2019 Ricardo González
+# Licensed under the Apache License, Version 2.0
+
+import json
+import logging
+
+from conftest import container
+
+from devloy import docker, start
+from devloy.docker import DockerClient
+from devloy.pool import claim_container, pooled_container_name, prepare_container
+
+logger = logging.getLogger(__name__)
+
+DOCKER_ARGS = ['docker', 'run', '-ti', '--name', 'dev_foo_main', '-v', '/src/foo:/src/foo', 'ubuntu:latest']
+
+
+def test_pooled_container_name():
+    other_name = DOCKER_ARGS[:4] + ['dev_foo_other'] + DOCKER_ARGS[5:]
+    other_mounts = DOCKER_ARGS[:6] + ['/src/bar:/src/bar'] + DOCKER_ARGS[7:]
+
+    assert pooled_container_name(DOCKER_ARGS).startswith('dev__pool_')
+    assert pooled_container_name(DOCKER_ARGS) == pooled_container_name(other_name)
+    assert pooled_container_name(DOCKER_ARGS) != pooled_container_name(other_mounts)
+
+
+def test_prepare_container(docker_cli):
+    client = DockerClient(use_cli=True)
+
+    name = prepare_container(DOCKER_ARGS, logger, client)
+    assert name == prepare_container(DOCKER_ARGS, logger, client)
+
+    containers = json.loads(docker_cli.read_text())
+    assert 'running' == containers[name]['State']
+    assert 'ubuntu:latest' == containers[name]['Image']
+    calls = [json.loads(line) for line in docker_cli.with_name(docker_cli.name + '.log').read_text().splitlines()]
+    created = [call for call in calls if 'create' == call[0]]
+    assert [['create', '--name', name, '-ti', '-v', '/src/foo:/src/foo', 'ubuntu:latest']] == created
+
+
+def test_claim_container(docker_api):
+    name = pooled_container_name(DOCKER_ARGS)
+    docker_api.containers[name] = container('1')
+    client = DockerClient(docker_api.socket_path)
+
+    assert 'running' == claim_container(DOCKER_ARGS, 'dev_foo_main', client=client)
+    assert ['dev_foo_main'] == list(docker_api.containers)
+    # Already claimed.
+    assert claim_container(DOCKER_ARGS, 'dev_foo_main', client=client) is None
+
+
+def test_claim_container_in_use(docker_api):
+    name = pooled_container_name(DOCKER_ARGS)
+    docker_api.containers.update({name: container('1'), 'dev_foo_main': container('2')})
+
+    assert claim_container(DOCKER_ARGS, 'dev_foo_main', client=DockerClient(docker_api.socket_path)) is None
+    assert name in docker_api.containers
+
+
+def test_start_claims_pooled_container(docker_api, monkeypatch):
+    docker_api.containers[pooled_container_name(DOCKER_ARGS)] = container('1', state='created')
+    monkeypatch.setattr(docker, '_client', DockerClient(docker_api.socket_path))
+    executed = []
+    monkeypatch.setattr(start, 'exec_docker', executed.append)
+    command = start.StartCommand('dev_foo_main', 'ubuntu:latest', logger, None, False, False)
+
+    assert not command.claim_pooled_container(DOCKER_ARGS[:-1] + ['other:latest'])
+    assert command.claim_pooled_container(DOCKER_ARGS)
+    assert [['docker', 'start', '-i', 'dev_foo_main']] == executed
+    assert ['dev_foo_main'] == list(docker_api.containers)
@@ -0,0 +1,60 @@
+# Copyright 2019 Ricardo González
+# Licensed under the Apache License, Version 2.0
+
+from concurrent.futures import ThreadPoolExecutor
+
+from devloy.cache import ProjectCache
+from devloy.index import SearchPathsIndex
+from devloy.workspace import resolve_workspace
+
+DEPENDENCIES = {
+    'app': ['core', 'utils'],
+    'tool': ['core'],
+    'core': ['utils'],
+    'utils': [],
+    'lonely': ['missing'],
+}
+
+
+def make_project(search_path, name, dependencies):
+    project_dir = search_path / name / 'master'
+    git_dir = project_dir / '.git'
+    git_dir.mkdir(parents=True)
+    (git_dir / 'HEAD').write_text('ref: refs/heads/master\n')
+    (git_dir / 'config').write_text('[remote "origin"]\n\turl = https://git.example.com/{}.git\n'.format(name))
+    colcon_pkg = 'name: {}\n'.format(name)
+    if dependencies:
+        colcon_pkg += 'dependencies: [{}]\n'.format(', '.join(dependencies))
+    (project_dir / 'colcon.pkg').write_text(colcon_pkg)
+    repos = 'repositories:\n'
+    for dependency in dependencies:
+        repos += '  {}:\n    type: git\n    url: https://git.example.com/{}.git\n    version: master\n'.format(
+                dependency, dependency)
+    (project_dir / '{}.repos'.format(name)).write_text(repos)
+    return project_dir
+
+
+def summary(workspace):
+    return workspace.name, workspace.container_name, dict(workspace.projects), workspace.order, workspace.missing
+
+
+def test_resolve_workspaces_in_threads(tmp_path):
+    search_path = tmp_path / 'repos'
+    project_dirs = [make_project(search_path, name, dependencies) for name, dependencies in DEPENDENCIES.items()]
+    expected = [summary(resolve_workspace(project_dir, [search_path])) for project_dir in project_dirs]
+    assert {'app', 'core', 'utils'} == set(expected[0][2])
+    assert ('missing',) == expected[-1][4]
+
+    # Resolutions sharing the cache and the index, while it is saved, first filling them and then reading them.
+    cache = ProjectCache(tmp_path / 'projects.json')
+    index = SearchPathsIndex([search_path], tmp_path / 'index.json')
+
+    def resolve(project_dir):
+        workspace = resolve_workspace(project_dir, [search_path], cache=cache, index=index, max_workers=2)
+        cache.save()
+        index.save()
+        return summary(workspace)
+
+    for _ in range(2):
+        with ThreadPoolExecutor(8) as executor:
+            assert expected * 4 == list(executor.map(resolve, project_dirs * 4))